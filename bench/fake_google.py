@@ -0,0 +1,269 @@
+"""
+In-process stand-in for the Calendar v3 and Meet v2 APIs used by the monitor.
+FakeGoogle.build() is a drop-in for googleapiclient.discovery.build and serves
+generated data with configurable latency, error rate and 429 rate. FakeHttp
+serves the same data at the HTTP level instead, so the real client library
+(discovery services, AuthorizedHttp, batch requests) runs on top of it.
+"""
+import datetime
+import email.parser
+import json
+import random
+import threading
+import time
+import urllib.parse
+
+import httplib2
+from googleapiclient.errors import HttpError
+
+def _iso(ts):
+    return datetime.datetime.fromtimestamp(ts, datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+class FakeRequest:
+    def __init__(self, backend, method_id, handler):
+        self.backend = backend
+        self.methodId = method_id
+        self.handler = handler
+
+    def execute(self, http=None, num_retries=0):
+        self.backend.before_call(self.methodId)
+        return self.handler()
+
+class FakeBatch:
+    def __init__(self, backend, callback):
+        self.backend = backend
+        self.callback = callback
+        self.requests = []
+
+    def add(self, request, callback=None, request_id=None):
+        self.requests.append((request, callback or self.callback, request_id or str(len(self.requests))))
+
+    def execute(self, http=None):
+        # One round-trip for the whole batch; sub-requests can still fail individually
+        self.backend.before_call('batch', sub_requests=len(self.requests))
+        for request, callback, request_id in self.requests:
+            try:
+                self.backend.maybe_fail(request.methodId)
+                response, error = request.handler(), None
+            except HttpError as e:
+                response, error = None, e
+            callback(request_id, response, error)
+
+class FakeHttp:
+    """httplib2.Http stand-in answering the REST calls and HTTP batches of the real client library."""
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def request(self, uri, method='GET', body=None, headers=None, redirections=5, connection_type=None):
+        parsed = urllib.parse.urlsplit(uri)
+        if parsed.path.startswith('/batch'):
+            return self._batch(body, headers)
+        try:
+            result = self.backend.route(parsed.path, parsed.query).execute()
+        except HttpError as e:
+            return self._response(e.resp.status, e.content)
+        return self._response(200, json.dumps(result).encode())
+
+    def _response(self, status, content, content_type='application/json'):
+        return httplib2.Response({'status': str(status), 'content-type': content_type}), content
+
+    def _batch(self, body, headers):
+        content_type = {k.lower(): v for k, v in headers.items()}['content-type']
+        message = email.parser.Parser().parsestr(f"content-type: {content_type}\r\n\r\n{body}")
+        parts = message.get_payload()
+        # One round-trip for the whole batch; sub-requests can still fail individually
+        self.backend.before_call('batch', sub_requests=len(parts))
+        boundary = 'fake_batch_boundary'
+        out = []
+        for part in parts:
+            target = part.get_payload().split('\n', 1)[0].split(' ')[1]
+            path, _, query = target.partition('?')
+            try:
+                request = self.backend.route(path, query)
+                self.backend.maybe_fail(request.methodId)
+                status, content = 200, json.dumps(request.handler())
+            except HttpError as e:
+                status, content = e.resp.status, e.content.decode()
+            content_id = part['Content-ID'].replace('<', '<response-', 1)
+            out.append(f"--{boundary}\r\nContent-Type: application/http\r\nContent-ID: {content_id}\r\n\r\n"
+                       f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\nContent-Type: application/json\r\n\r\n{content}\r\n")
+        out.append(f"--{boundary}--\r\n")
+        return self._response(200, "".join(out).encode(), f'multipart/mixed; boundary="{boundary}"')
+
+class _Resource:
+    def __init__(self, **methods):
+        self.__dict__.update(methods)
+
+class FakeGoogle:
+    def __init__(self, latency=0.0, error_rate=0.0, rate_429=0.0, seed=0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_429 = rate_429
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.round_trips = 0
+        self.calendars = {}
+        self.records = {}
+        self.participants = {}
+        self.recordings = {}
+
+    # --- accounting ------------------------------------------------------
+    def reset_counters(self):
+        with self.lock:
+            self.calls = {}
+            self.round_trips = 0
+
+    def total_calls(self):
+        with self.lock:
+            return sum(self.calls.values())
+
+    def maybe_fail(self, method_id):
+        with self.lock:
+            roll = self.random.random()
+        if roll < self.rate_429:
+            raise HttpError(httplib2.Response({'status': 429}), b'Rate limit exceeded')
+        if roll < self.rate_429 + self.error_rate:
+            raise HttpError(httplib2.Response({'status': 503}), b'Backend error')
+
+    def before_call(self, method_id, sub_requests=1):
+        with self.lock:
+            self.round_trips += 1
+            self.calls[method_id] = self.calls.get(method_id, 0) + sub_requests
+        if self.latency:
+            time.sleep(self.latency)
+        if method_id != 'batch':
+            self.maybe_fail(method_id)
+
+    # --- data generation -------------------------------------------------
+    def populate(self, roster, sessions=1000, participants=20, calendars=20, shared_codes=0.1, now=None):
+        """
+        Creates `sessions` events spread over the -2h/+6h window across `calendars`
+        calendars. Sessions already running get a live conference record with up
+        to `participants` participants named after roster people (plus guests).
+        """
+        now = now or time.time()
+        rng = self.random
+        names = list(zip(roster.names, roster.emails)) or [("guest user", "guest@example.com")]
+        codes = []
+        for i in range(sessions):
+            if codes and rng.random() < shared_codes:
+                code = rng.choice(codes)
+            else:
+                code = f"abc-{i:04d}-xyz"
+                codes.append(code)
+            start = now - 2 * 3600 + rng.randrange(0, 8 * 3600 // 900) * 900
+            end = start + rng.choice((1800, 3600))
+            invited = rng.sample(names, min(3, len(names)))
+            event = {
+                'id': f"evt{i:05d}",
+                'status': 'confirmed',
+                'summary': f"Session {i}",
+                'start': {'dateTime': _iso(start)},
+                'end': {'dateTime': _iso(end)},
+                'hangoutLink': f"https://meet.google.com/{code}",
+                'attendees': [{'email': email, 'displayName': name.title(), 'responseStatus': 'accepted'} for name, email in invited],
+            }
+            self.calendars.setdefault(f"cal{i % calendars}@group.calendar.google.com", []).append(event)
+            if start <= now <= end and code not in self.records:
+                record = f"conferenceRecords/{code}-1"
+                self.records[code] = [{'name': record, 'startTime': _iso(start)}]
+                people = []
+                for j in range(rng.randint(1, participants)):
+                    name, _ = rng.choice(names)
+                    user = {'displayName': " ".join(w.capitalize() for w in name.split())}
+                    kind = 'signedinUser' if rng.random() < 0.7 else 'anonymousUser'
+                    left = _iso(now - 60) if rng.random() < 0.2 else None
+                    p = {'name': f"{record}/participants/{j}", kind: user, 'earliestStartTime': _iso(start + 60)}
+                    if left: p['latestEndTime'] = left
+                    people.append(p)
+                self.participants[record] = people
+                self.recordings[record] = [{'name': f"{record}/recordings/1"}] if rng.random() < 0.3 else []
+        for events in self.calendars.values():
+            events.sort(key=lambda e: e['start']['dateTime'])
+
+    # --- discovery.build replacement --------------------------------------
+    def build(self, service_name, version, **kwargs):
+        if service_name == 'calendar':
+            return self._calendar_service()
+        if service_name == 'meet':
+            return self._meet_service()
+        raise ValueError(f"Unknown service {service_name}")
+
+    def route(self, path, query):
+        """Maps a REST path and query string onto the fake resources; returns a FakeRequest."""
+        params = {k: v[0] for k, v in urllib.parse.parse_qs(query).items()}
+        page = {k: int(params[k]) for k in ('pageSize', 'maxResults') if k in params}
+        if 'pageToken' in params:
+            page['pageToken'] = params['pageToken']
+        parts = [urllib.parse.unquote(p) for p in path.strip('/').split('/')]
+        if parts[:2] == ['calendar', 'v3']:
+            calendar = self._calendar_service()
+            if parts[2:] == ['users', 'me', 'calendarList']:
+                return calendar.calendarList().list()
+            if len(parts) == 5 and parts[2] == 'calendars' and parts[4] == 'events':
+                return calendar.events().list(calendarId=parts[3], syncToken=params.get('syncToken'), **page)
+        if parts[:2] == ['v2', 'conferenceRecords']:
+            records = self._meet_service().conferenceRecords()
+            if len(parts) == 2:
+                return records.list(filter=params.get('filter'), **page)
+            parent = '/'.join(parts[1:3])
+            if parts[3:] == ['participants']:
+                return records.participants().list(parent=parent, filter=params.get('filter'), **page)
+            if parts[3:] == ['recordings']:
+                return records.recordings().list(parent=parent, **page)
+        raise HttpError(httplib2.Response({'status': 404}), f"Unknown endpoint {path}".encode())
+
+    def _page(self, items, key, page_size, page_token, extra=None):
+        start = int(page_token or 0)
+        end = start + page_size
+        result = {key: items[start:end]}
+        if end < len(items):
+            result['nextPageToken'] = str(end)
+        elif extra:
+            result.update(extra)
+        return result
+
+    def _calendar_service(self):
+        def calendar_list():
+            items = [{'id': cal_id, 'summary': cal_id} for cal_id in self.calendars]
+            return FakeRequest(self, 'calendar.calendarList.list', lambda: {'items': items})
+
+        def events_list(calendarId, maxResults=250, pageToken=None, syncToken=None, **kwargs):
+            def handler():
+                items = [] if syncToken else self.calendars.get(calendarId, [])
+                return self._page(items, 'items', maxResults, pageToken, {'nextSyncToken': f"sync-{calendarId}"})
+            return FakeRequest(self, 'calendar.events.list', handler)
+
+        return _Resource(
+            calendarList=lambda: _Resource(list=calendar_list),
+            events=lambda: _Resource(list=events_list),
+        )
+
+    def _meet_service(self):
+        def records_list(filter=None, pageSize=25, pageToken=None):
+            code = filter.split('"')[1] if filter and '"' in filter else None
+            items = self.records.get(code, []) if code else [r for rs in self.records.values() for r in rs]
+            if filter and 'end_time IS NULL' in filter:
+                items = [r for r in items if not r.get('endTime')]
+            return FakeRequest(self, 'meet.conferenceRecords.list', lambda: self._page(items, 'conferenceRecords', pageSize, pageToken))
+
+        def participants_list(parent, filter=None, pageSize=100, pageToken=None):
+            items = self.participants.get(parent, [])
+            if filter and 'latest_end_time IS NULL' in filter:
+                items = [p for p in items if not p.get('latestEndTime')]
+            return FakeRequest(self, 'meet.conferenceRecords.participants.list', lambda: self._page(items, 'participants', pageSize, pageToken))
+
+        def recordings_list(parent, pageSize=10, pageToken=None):
+            items = self.recordings.get(parent, [])
+            return FakeRequest(self, 'meet.conferenceRecords.recordings.list', lambda: self._page(items, 'recordings', pageSize, pageToken))
+
+        records = _Resource(
+            list=records_list,
+            participants=lambda: _Resource(list=participants_list),
+            recordings=lambda: _Resource(list=recordings_list),
+        )
+        service = _Resource(conferenceRecords=lambda: records)
+        service.new_batch_http_request = lambda callback=None: FakeBatch(self, callback)
+        return service
@@ -0,0 +1,186 @@
+"""
+Offline benchmark for the monitor against the fake Google backend.
+
+    python bench/run_bench.py --sessions 100,1000,5000 --participants 50 --latency-ms 40
+    python bench/run_bench.py --json results.json
+    python bench/run_bench.py --compare results.json --tolerance 0.25
+
+For every load it measures cycle time, API calls per cycle and peak traced
+memory of: calendar_client.get_upcoming_events, one server.skeleton_loader
+cycle (full and incremental sync), one attendance_monitor tick (per-session
+and batched enrichment) and find_in_db over the real students.csv/tutors.csv.
+With --real-client the fake data is served over a fake HTTP transport to
+services built by the real client library on a CredentialManager, so its
+request, auth and batch code paths are exercised too.
+--compare exits non-zero if any metric regressed by more than --tolerance.
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import resource
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Drive the loops by hand, without rate limiting, history writes or on-disk caches
+os.environ['MONITOR_AUTOSTART'] = '0'
+os.environ.setdefault('MEET_RPS', '0')
+os.environ.setdefault('ATTENDANCE_DB_PATH', '')
+os.environ.setdefault('ROSTER_CACHE_PATH', '')
+os.environ.setdefault('SKELETON_CACHE_PATH', '')
+os.chdir(ROOT)
+
+import auth
+import calendar_client
+import meet_client
+import server
+from fake_google import FakeGoogle, FakeHttp
+from google.oauth2.credentials import Credentials
+
+REAL_BUILD = calendar_client.build
+
+def measure(backend, fn, trace_memory, verbose=False):
+    """Runs fn once; returns (result, metrics dict)."""
+    backend.reset_counters()
+    if trace_memory:
+        tracemalloc.start()
+    output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+    start = time.perf_counter()
+    with output:
+        result = fn()
+    elapsed = time.perf_counter() - start
+    peak = None
+    if trace_memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    stats = {
+        "seconds": round(elapsed, 4),
+        "api_calls": backend.total_calls(),
+        "round_trips": backend.round_trips,
+    }
+    if peak is not None:
+        stats["peak_mb"] = round(peak / 2 ** 20, 2)
+    return result, stats
+
+def install_backend(backend, real_client=False):
+    """Returns the creds to run with; a fresh object also makes every thread rebuild its services."""
+    if real_client:
+        calendar_client.build = meet_client.build = REAL_BUILD
+        token = Credentials(token='fake-token', expiry=datetime.datetime.utcnow() + datetime.timedelta(days=1))
+        return auth.CredentialManager(token, transport=lambda: FakeHttp(backend))
+    calendar_client.build = meet_client.build = backend.build
+    return object()
+
+def reset_server_state():
+    server.calendar_skeleton = []
+    server.skeleton_by_hour = {}
+    server.enriched_sessions = []
+    server.meeting_states.clear()
+    server.poll_scheduler = server.scheduler.PollScheduler()
+    server.conference_cache.entries.clear()
+    server.calendar_sync = calendar_client.CalendarSync()
+
+def run_load(args, sessions):
+    backend = FakeGoogle(latency=args.latency_ms / 1000.0, error_rate=args.error_rate, rate_429=args.rate_429, seed=sessions)
+    backend.populate(server.roster, sessions=sessions, participants=args.participants, calendars=args.calendars)
+    server.creds = install_backend(backend, args.real_client)
+    reset_server_state()
+    calendar_client.retry_sleep = lambda s: None  # calendar retries back off instantly in the benchmark
+    results = {}
+
+    t_min = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(time.time() - 2 * 3600))
+    _, results["calendar.get_upcoming_events"] = measure(
+        backend, lambda: calendar_client.get_upcoming_events(server.creds, max_results=5000, time_min=t_min), args.trace_memory, args.verbose)
+
+    server.CALENDAR_SYNC_MODE = 'full'
+    _, results["skeleton_loader.full"] = measure(backend, server.sync_skeleton, args.trace_memory, args.verbose)
+    server.CALENDAR_SYNC_MODE = 'incremental'
+    _, results["skeleton_loader.incremental.first"] = measure(backend, server.sync_skeleton, args.trace_memory, args.verbose)
+    _, results["skeleton_loader.incremental.next"] = measure(backend, server.sync_skeleton, args.trace_memory, args.verbose)
+
+    server.active_timeframes = list(server.skeleton_by_hour)
+    for batch_mode in (False, True):
+        server.BATCH_MODE = batch_mode
+        server.meeting_states.clear()
+        server.poll_scheduler = server.scheduler.PollScheduler()
+        server.conference_cache.entries.clear()
+        label = "attendance_monitor.batched" if batch_mode else "attendance_monitor"
+        (view, _), results[label + ".cold"] = measure(backend, lambda: server.attendance_tick(None), args.trace_memory, args.verbose)
+        _, results[label + ".warm"] = measure(backend, lambda: server.attendance_tick(view), args.trace_memory, args.verbose)
+    server.BATCH_MODE = False
+
+    names = []
+    for people in backend.participants.values():
+        for p in people:
+            user = p.get('signedinUser') or p.get('anonymousUser')
+            names.append(user['displayName'])
+    names = (names * (args.lookups // max(1, len(names)) + 1))[:args.lookups]
+    server.name_index.match.cache_clear()
+    _, stats = measure(backend, lambda: [server.find_in_db(n) for n in names], args.trace_memory, args.verbose)
+    stats["lookups"] = len(names)
+    results["find_in_db"] = stats
+    return results
+
+def compare(current, baseline, tolerance):
+    regressions = []
+    for load, scenarios in current.items():
+        for scenario, stats in scenarios.items():
+            base = baseline.get(load, {}).get(scenario)
+            if not base:
+                continue
+            for key in ("seconds", "api_calls", "peak_mb"):
+                if key in stats and base.get(key):
+                    if stats[key] > base[key] * (1 + tolerance) and stats[key] - base[key] > 0.01:
+                        regressions.append(f"{load} {scenario} {key}: {base[key]} -> {stats[key]}")
+    return regressions
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument('--sessions', default='100,1000,5000', help='comma separated session counts')
+    ap.add_argument('--participants', type=int, default=50, help='max participants per live meeting')
+    ap.add_argument('--calendars', type=int, default=20)
+    ap.add_argument('--latency-ms', type=float, default=0.0, help='simulated latency per round-trip')
+    ap.add_argument('--error-rate', type=float, default=0.0, help='fraction of calls failing with 503')
+    ap.add_argument('--rate-429', type=float, default=0.0, help='fraction of calls failing with 429')
+    ap.add_argument('--lookups', type=int, default=20000, help='find_in_db calls to time')
+    ap.add_argument('--real-client', action='store_true',
+                    help='serve the fake data over HTTP to the real client library and a CredentialManager')
+    ap.add_argument('--no-trace-memory', dest='trace_memory', action='store_false', help='skip tracemalloc (faster, no peak_mb)')
+    ap.add_argument('--verbose', action='store_true', help="show the monitor's own log output")
+    ap.add_argument('--json', help='write results to this file')
+    ap.add_argument('--compare', help='baseline JSON from a previous --json run')
+    ap.add_argument('--tolerance', type=float, default=0.25, help='allowed relative regression for --compare')
+    args = ap.parse_args()
+
+    server.load_databases()
+    all_results = {}
+    for sessions in [int(n) for n in args.sessions.split(',') if n]:
+        print(f"\n=== {sessions} sessions ===")
+        results = run_load(args, sessions)
+        for scenario, stats in results.items():
+            print(f"  {scenario:<42} " + "  ".join(f"{k}={v}" for k, v in stats.items()))
+        all_results[str(sessions)] = results
+    print(f"\nProcess max RSS: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f} MB")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(all_results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(all_results, json.load(f), args.tolerance)
+        if regressions:
+            print("\n❌ Regressions:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("\n✅ No regressions against baseline.")
+
+if __name__ == '__main__':
+    main()
@@ -17,9 +17,12 @@ trap "kill 0" EXIT
 echo "🚀 Starting Backend API on port 3001..."
 python3 src/server.py > api_logs.txt 2>&1 &
 
-# Wait for backend to start
+# Wait until the backend has sessions to serve (gives up after 60s)
 echo "⏳ Waiting for backend to initialize..."
-sleep 5
+for i in $(seq 120); do
+    curl -sf http://localhost:3001/ready > /dev/null && break
+    sleep 0.5
+done
 
 # Start Vite Frontend (preview mode since we built it)
 echo "🌐 Starting UI (Port 5173)..."
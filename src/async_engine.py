@@ -0,0 +1,215 @@
+import asyncio
+import datetime
+import os
+import random
+import time
+from urllib.parse import quote
+import httpx
+try:
+    from . import auth
+    from . import calendar_client
+    from . import meet_client
+    from . import metrics
+except ImportError:
+    import auth
+    import calendar_client
+    import meet_client
+    import metrics
+
+CALENDAR_URL = 'https://www.googleapis.com/calendar/v3'
+MEET_URL = 'https://meet.googleapis.com/v2'
+# Requests in flight at once across both APIs; HTTP/2 multiplexes them over a few connections
+CONCURRENCY = int(os.environ.get('ASYNC_CONCURRENCY', '200'))
+MAX_CONNECTIONS = int(os.environ.get('ASYNC_MAX_CONNECTIONS', '10'))
+
+class GoogleClient:
+    """
+    Async REST client for the Calendar v3 and Meet v2 endpoints the monitor uses.
+    Every coroutine shares one pooled httpx client (HTTP/2, keep-alive), a
+    semaphore bounds the requests in flight, and an expired access token is
+    refreshed once no matter how many requests notice it.
+    """
+
+    def __init__(self, creds, concurrency=CONCURRENCY):
+        self.creds = creds
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.refresh_lock = asyncio.Lock()
+        self.http = httpx.AsyncClient(
+            http2=True,
+            timeout=httpx.Timeout(30.0, connect=10.0),
+            limits=httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_CONNECTIONS, keepalive_expiry=120)
+        )
+
+    async def aclose(self):
+        await self.http.aclose()
+
+    async def _refresh(self, stale_token=None):
+        async with self.refresh_lock:
+            # Another coroutine may have refreshed while we waited for the lock
+            if self.creds.valid and self.creds.token != stale_token:
+                return
+            if isinstance(self.creds, auth.CredentialManager):
+                # Single-flight with the threads sharing the same manager
+                await asyncio.to_thread(self.creds.refresh, stale_token=stale_token or self.creds.token)
+            else:
+                from google.auth.transport.requests import Request
+                await asyncio.to_thread(self.creds.refresh, Request())
+
+    async def get(self, api, method, url, params=None):
+        """GET with auth, retries on 429/5xx (exponential backoff with jitter) and one re-auth on 401."""
+        if api == 'meet':
+            await asyncio.sleep(meet_client.rate_limiter.reserve())
+        for attempt in range(calendar_client.MAX_RETRIES + 1):
+            if not self.creds.valid:
+                await self._refresh()
+            token = self.creds.token
+            start = time.perf_counter()
+            try:
+                async with self.semaphore:
+                    response = await self.http.get(url, params=params, headers={'Authorization': f'Bearer {token}'})
+                response.raise_for_status()
+            except httpx.HTTPStatusError as e:
+                metrics.record_api_call(api, method, time.perf_counter() - start, e)
+                status = e.response.status_code
+                if status == 401 and attempt == 0:
+                    await self._refresh(stale_token=token)
+                    continue
+                if status not in calendar_client.RETRY_STATUSES or attempt == calendar_client.MAX_RETRIES:
+                    raise
+                delay = min(2 ** attempt, 32) + random.random()
+                print(f"⏳ {api} API returned {status}, retrying in {delay:.1f}s...")
+                await asyncio.sleep(delay)
+                continue
+            except Exception as e:
+                metrics.record_api_call(api, method, time.perf_counter() - start, e)
+                raise
+            metrics.record_api_call(api, method, time.perf_counter() - start)
+            return response.json()
+
+    async def list_all(self, api, method, url, key, params=None):
+        """Follows nextPageToken; returns (items, last page) so callers can read nextSyncToken."""
+        params = dict(params or {})
+        items = []
+        while True:
+            page = await self.get(api, method, url, params)
+            items.extend(page.get(key, []))
+            if not page.get('nextPageToken'):
+                return items, page
+            params['pageToken'] = page['nextPageToken']
+
+    # --- Calendar ---------------------------------------------------------
+    async def list_calendars(self):
+        items, _ = await self.list_all('calendar', 'calendar.calendarList.list', f"{CALENDAR_URL}/users/me/calendarList", 'items')
+        return items
+
+    async def list_events(self, cal_id, **params):
+        """Returns (items, nextSyncToken) for one calendar."""
+        params = {'maxResults': 250, 'singleEvents': 'true', **params}
+        url = f"{CALENDAR_URL}/calendars/{quote(cal_id, safe='')}/events"
+        items, last = await self.list_all('calendar', 'calendar.events.list', url, 'items', params)
+        return items, last.get('nextSyncToken')
+
+    async def get_upcoming_events(self, max_results=250, time_min=None, time_max=None):
+        """Async calendar_client.get_upcoming_events: every calendar is fetched concurrently."""
+        if not time_min:
+            time_min = datetime.datetime.now(datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+        try:
+            calendar_list = await self.list_calendars()
+        except Exception as e:
+            print(f"❌ Error fetching calendar list: {e}")
+            calendar_list = [{'id': 'primary'}]
+        params = {'timeMin': time_min, 'orderBy': 'startTime'}
+        if time_max: params['timeMax'] = time_max
+
+        async def fetch(cal_id):
+            try:
+                items, _ = await self.list_events(cal_id, **params)
+                return items[:max_results] if max_results else items
+            except Exception as e:
+                print(f"⚠️ Could not sync calendar {cal_id}: {e}")
+                return []
+
+        per_calendar = await asyncio.gather(*(fetch(cal.get('id')) for cal in calendar_list))
+        unique_events = {e['id']: e for events in per_calendar for e in events}.values()
+        ordered = sorted(unique_events, key=lambda x: calendar_client._event_bounds(x)[0])
+        return ordered[:max_results] if max_results else ordered
+
+    # --- Meet -------------------------------------------------------------
+    async def list_conference_records(self, filter_query=None):
+        params = {'pageSize': min(meet_client.PAGE_SIZE, 100)}
+        if filter_query: params['filter'] = filter_query
+        try:
+            items, _ = await self.list_all('meet', 'meet.conferenceRecords.list', f"{MEET_URL}/conferenceRecords",
+                                           'conferenceRecords', params)
+            return items
+        except Exception as e:
+            print(f"Error fetching conference records: {e}")
+            return []
+
+    async def find_conference_records(self, meeting_code, running_only=False):
+        """Async meet_client.find_conference_records: the running record, else (unless running_only) the latest ended one."""
+        code_filter = f'space.meeting_code="{meeting_code}"'
+        running = await self.list_conference_records(f'{code_filter} AND {meet_client.RUNNING_FILTER}')
+        if running or running_only:
+            return running
+        try:
+            page = await self.get('meet', 'meet.conferenceRecords.list', f"{MEET_URL}/conferenceRecords",
+                                  {'filter': code_filter, 'pageSize': 1})
+            return page.get('conferenceRecords', [])
+        except Exception as e:
+            print(f"Error fetching conference records for {meeting_code}: {e}")
+            return []
+
+    async def get_participants(self, conference_id, active_only=False):
+        """Raises on failure: an empty list would read as everyone having left."""
+        params = {'pageSize': meet_client.PAGE_SIZE}
+        if active_only: params['filter'] = meet_client.ACTIVE_FILTER
+        items, _ = await self.list_all('meet', 'meet.conferenceRecords.participants.list',
+                                       f"{MEET_URL}/{conference_id}/participants", 'participants', params)
+        return items
+
+    async def get_recordings(self, conference_id):
+        try:
+            items, _ = await self.list_all('meet', 'meet.conferenceRecords.recordings.list',
+                                           f"{MEET_URL}/{conference_id}/recordings", 'recordings')
+            return items
+        except Exception:
+            # 403 or 404 is common if no recordings exist or feature is disabled
+            return []
+
+class AsyncCalendarSync(calendar_client.CalendarSync):
+    """CalendarSync whose sync() is a coroutine: all calendars are synced concurrently on the event loop."""
+
+    async def sync(self, client, time_min, time_max):
+        try:
+            calendar_list = await client.list_calendars()
+        except Exception as e:
+            print(f"❌ Error fetching calendar list: {e}")
+            calendar_list = [{'id': cal_id} for cal_id in self.store] or [{'id': 'primary'}]
+        cal_ids = [cal.get('id') for cal in calendar_list]
+        self._prepare(cal_ids, time_min, time_max)
+        results = await asyncio.gather(*(self._sync_calendar(client, cal_id) for cal_id in cal_ids))
+        for cal_id, result in zip(cal_ids, results):
+            if result is not None:
+                self._apply(cal_id, *result)
+        return self.events(time_min, time_max)
+
+    async def _sync_calendar(self, client, cal_id):
+        """Returns (is_full, items, next_sync_token) or None on failure."""
+        token = self.tokens.get(cal_id)
+        if token:
+            try:
+                return (False,) + await client.list_events(cal_id, syncToken=token)
+            except httpx.HTTPStatusError as e:
+                if e.response.status_code != 410:
+                    print(f"⚠️ Could not sync calendar {cal_id}: {e}")
+                    return None
+                print(f"♻️ Sync token expired for {cal_id}, running full sync.")
+            except Exception as e:
+                print(f"⚠️ Could not sync calendar {cal_id}: {e}")
+                return None
+        try:
+            return (True,) + await client.list_events(cal_id, timeMin=self.window[0], timeMax=self.window[1])
+        except Exception as e:
+            print(f"⚠️ Could not sync calendar {cal_id}: {e}")
+            return None
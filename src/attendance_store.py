@@ -0,0 +1,241 @@
+import queue
+import sqlite3
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS intervals (
+    conference_id TEXT NOT NULL,
+    participant_id TEXT NOT NULL,
+    meeting_code TEXT NOT NULL,
+    display_name TEXT,
+    email TEXT,
+    joined_ts REAL NOT NULL,
+    left_ts REAL,
+    PRIMARY KEY (conference_id, participant_id)
+);
+CREATE INDEX IF NOT EXISTS idx_intervals_email ON intervals (email, joined_ts);
+CREATE INDEX IF NOT EXISTS idx_intervals_code ON intervals (meeting_code, email, joined_ts);
+CREATE TABLE IF NOT EXISTS sessions (
+    event_id TEXT PRIMARY KEY,
+    meeting_code TEXT,
+    summary TEXT,
+    start_ts REAL NOT NULL,
+    end_ts REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_sessions_start ON sessions (start_ts);
+CREATE TABLE IF NOT EXISTS conferences (
+    conference_id TEXT PRIMARY KEY,
+    meeting_code TEXT NOT NULL,
+    seen_ts REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS session_attendees (
+    event_id TEXT NOT NULL,
+    email TEXT NOT NULL,
+    PRIMARY KEY (event_id, email)
+);
+"""
+
+UPSERT_INTERVAL = """
+INSERT INTO intervals VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (conference_id, participant_id) DO UPDATE SET
+    display_name = excluded.display_name, email = excluded.email,
+    joined_ts = excluded.joined_ts, left_ts = excluded.left_ts
+"""
+CLOSE_INTERVAL = "UPDATE intervals SET left_ts = ? WHERE conference_id = ? AND participant_id = ? AND left_ts IS NULL"
+
+# How long around a session's scheduled time a join still counts as attending it
+SESSION_SLACK = 15 * 60
+
+class AttendanceStore:
+    """
+    Append-mostly attendance history in SQLite (WAL mode).
+    Monitor threads only diff against what they last recorded and enqueue the
+    changed rows; a single writer thread applies them in batched transactions,
+    so recording never blocks the monitoring loop. Only the polling process
+    records (see start_writing); in every other process the store only reads.
+    """
+
+    def __init__(self, path, batch_size=500, max_pending=20000):
+        self.path = path
+        self.batch_size = batch_size
+        self.pending = queue.Queue(maxsize=max_pending)
+        self.dropped = 0
+        self._intervals = {}
+        self._touched = {}
+        self._codes = {}
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self.writing = False
+        db = self._connect()
+        db.executescript(SCHEMA)
+        db.close()
+
+    def start_writing(self):
+        """
+        Makes this process the recorder, once it holds the polling role. Intervals
+        left open by the previous poller end when their conference was last
+        observed (participants still in the call are reopened by the next poll),
+        then the writer thread starts.
+        """
+        if self.writing:
+            return
+        self.writing = True
+        db = self._connect()
+        with db:
+            db.execute("""
+                UPDATE intervals SET left_ts = MAX(joined_ts, COALESCE(
+                    (SELECT seen_ts FROM conferences c WHERE c.conference_id = intervals.conference_id), joined_ts))
+                WHERE left_ts IS NULL
+            """)
+        db.close()
+        threading.Thread(target=self._writer, daemon=True).start()
+
+    def _connect(self, read_only=False):
+        db = sqlite3.connect(self.path, timeout=30)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        if read_only:
+            db.execute("PRAGMA query_only=ON")
+        return db
+
+    def _enqueue(self, sql, params):
+        if not self.writing:
+            return
+        try:
+            self.pending.put_nowait((sql, params))
+        except queue.Full:
+            self.dropped += 1
+
+    def record_participants(self, conference_id, meeting_code, participants, observed_at=None):
+        """
+        participants: [{'id', 'name', 'email', 'joined', 'left'}] with epoch seconds.
+        Only rows that differ from the previous observation are written. Open
+        intervals whose participant is no longer listed are closed at observed_at.
+        """
+        observed_at = observed_at or time.time()
+        with self._lock:
+            known = self._intervals.setdefault(conference_id, {})
+            self._touched[conference_id] = observed_at
+            self._codes[conference_id] = meeting_code
+            self._enqueue("INSERT OR REPLACE INTO conferences VALUES (?, ?, ?)", (conference_id, meeting_code, observed_at))
+            seen = set()
+            for p in participants:
+                seen.add(p['id'])
+                row = (p.get('email'), p['joined'], p.get('left'))
+                if known.get(p['id']) != row:
+                    known[p['id']] = row
+                    self._enqueue(UPSERT_INTERVAL, (conference_id, p['id'], meeting_code, p.get('name'), *row))
+            for pid, (email, joined, left) in list(known.items()):
+                if pid not in seen and left is None:
+                    known[pid] = (email, joined, observed_at)
+                    self._enqueue(CLOSE_INTERVAL, (observed_at, conference_id, pid))
+
+    def close_meeting(self, meeting_code):
+        """The meeting is no longer polled: its open intervals end at the last time it was observed."""
+        with self._lock:
+            for conf_id in [c for c, code in self._codes.items() if code == meeting_code]:
+                self._close(conf_id)
+
+    def _close(self, conference_id):
+        """Closes a conference's open intervals at its last observation and stops tracking it (lock held)."""
+        seen = self._touched.pop(conference_id)
+        self._codes.pop(conference_id, None)
+        for pid, (email, joined, left) in self._intervals.pop(conference_id, {}).items():
+            if left is None:
+                self._enqueue(CLOSE_INTERVAL, (seen, conference_id, pid))
+
+    def record_sessions(self, sessions, code_of):
+        """
+        Upserts scheduled sessions and their expected attendees when they changed.
+        Also forgets change-tracking state for sessions and conferences no longer in view.
+        """
+        with self._lock:
+            current = {s['id'] for s in sessions}
+            for event_id in [e for e in self._sessions if e not in current]:
+                del self._sessions[event_id]
+            cutoff = time.time() - 12 * 3600
+            for conf_id in [c for c, ts in self._touched.items() if ts < cutoff]:
+                self._close(conf_id)
+            for s in sessions:
+                code = code_of(s) if s.get('meetingLink') else None
+                emails = sorted({a['email'] for a in s.get('attendees', []) if a.get('email')})
+                key = (code, s.get('summary'), s['startTs'], s['endTs'], tuple(emails))
+                if self._sessions.get(s['id']) == key:
+                    continue
+                self._sessions[s['id']] = key
+                self._enqueue(
+                    "INSERT OR REPLACE INTO sessions VALUES (?, ?, ?, ?, ?)",
+                    (s['id'], code, s.get('summary'), s['startTs'], s['endTs'])
+                )
+                self._enqueue("DELETE FROM session_attendees WHERE event_id = ?", (s['id'],))
+                for email in emails:
+                    self._enqueue("INSERT OR IGNORE INTO session_attendees VALUES (?, ?)", (s['id'], email))
+
+    def _writer(self):
+        db = self._connect()
+        while True:
+            batch = [self.pending.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.pending.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                with db:
+                    for sql, params in batch:
+                        db.execute(sql, params)
+            except Exception as e:
+                print(f"❌ [HISTORY] Write failed ({len(batch)} rows): {e}")
+
+    def student_minutes(self, email, start_ts, end_ts):
+        """Minutes attended by one roster email within [start_ts, end_ts), per meeting code."""
+        now = time.time()
+        db = self._connect(read_only=True)
+        try:
+            rows = db.execute(
+                """
+                SELECT meeting_code,
+                       SUM(MAX(0, MIN(COALESCE(left_ts, :now), :end) - MAX(joined_ts, :start))) / 60.0
+                FROM intervals
+                WHERE email = :email AND joined_ts < :end AND COALESCE(left_ts, :now) > :start
+                GROUP BY meeting_code
+                """,
+                {"email": email, "start": start_ts, "end": end_ts, "now": now}
+            ).fetchall()
+        finally:
+            db.close()
+        by_meeting = {code: round(minutes, 1) for code, minutes in rows}
+        return {"email": email, "minutes": round(sum(by_meeting.values()), 1), "byMeeting": by_meeting}
+
+    def session_rates(self, start_ts, end_ts):
+        """Expected vs attended attendees for every session starting within [start_ts, end_ts)."""
+        now = time.time()
+        db = self._connect(read_only=True)
+        try:
+            rows = db.execute(
+                """
+                SELECT s.event_id, s.summary, s.start_ts, COUNT(a.email),
+                       COUNT(CASE WHEN EXISTS (
+                           SELECT 1 FROM intervals i
+                           WHERE i.meeting_code = s.meeting_code AND i.email = a.email
+                             AND i.joined_ts < s.end_ts + :slack
+                             AND COALESCE(i.left_ts, :now) > s.start_ts - :slack
+                       ) THEN 1 END)
+                FROM sessions s LEFT JOIN session_attendees a ON a.event_id = s.event_id
+                WHERE s.start_ts >= :start AND s.start_ts < :end
+                GROUP BY s.event_id
+                ORDER BY s.start_ts
+                """,
+                {"start": start_ts, "end": end_ts, "now": now, "slack": SESSION_SLACK}
+            ).fetchall()
+        finally:
+            db.close()
+        return [{
+            "id": event_id,
+            "summary": summary,
+            "startTs": start,
+            "expected": expected,
+            "attended": attended,
+            "rate": round(attended / expected, 3) if expected else None
+        } for event_id, summary, start, expected, attended in rows]
@@ -2,9 +2,14 @@ import os.path
 import pickle
 import json
 import base64
-from google.auth.transport.requests import Request
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.oauth2.credentials import Credentials
+import datetime
+import random
+import threading
+import time
+try:
+    from . import metrics
+except ImportError:
+    import metrics
 
 # If modifying these scopes, delete the file token.pickle.
 SCOPES = [
@@ -15,8 +20,25 @@ SCOPES = [
 
 CREDENTIALS_FILE = 'credentials.json'
 TOKEN_FILE = 'token.pickle'
+# Refresh this long before the access token expires, plus a per-process jitter so a
+# fleet started together does not refresh in the same second
+REFRESH_MARGIN = int(os.environ.get('TOKEN_REFRESH_MARGIN', '300'))
+REFRESH_JITTER = 120
+HTTP_TIMEOUT = 60
+
+refresh_seconds = metrics.Histogram('papaya_token_refresh_seconds', 'OAuth access token refresh latency.')
+refresh_failures_total = metrics.Counter('papaya_token_refresh_failures_total', 'OAuth access token refreshes that failed.')
+# The started CredentialManager, for the expiry gauge
+current = None
+metrics.Gauge('papaya_token_expiry_seconds', 'Seconds until the OAuth access token expires.', lambda: current.seconds_left())
+
+def _in_production():
+    return bool(os.environ.get('RENDER') or os.environ.get('PORT'))
 
 def authenticate():
+    # The OAuth transport and flow modules are heavy; import them only when authenticating
+    from google.auth.transport.requests import Request
+    from google_auth_oauthlib.flow import InstalledAppFlow
     creds = None
     
     # Try reading token from environment variable first (for Render)
@@ -59,15 +81,156 @@ def authenticate():
                  print("❌ No credentials found in environment or local file!")
                  raise FileNotFoundError(f"Could not find {CREDENTIALS_FILE} or GOOGLE_CREDENTIALS_JSON environment variable.")
 
-            if os.environ.get('RENDER') or os.environ.get('PORT'):
+            if _in_production():
                 print("⚠️  Running in production but no valid token found. Cannot perform browser login.")
                 raise Exception("OAuth flow cannot be completed in production. Please provide GOOGLE_TOKEN_PICKLE.")
             
             print("🌐 Starting local browser login...")
             creds = flow.run_local_server(port=0)
             
-        if not (os.environ.get('RENDER') or os.environ.get('PORT')):
+        if not _in_production():
             with open(TOKEN_FILE, 'wb') as token:
                 pickle.dump(creds, token)
 
     return creds
+
+class _SharedCredentials:
+    """
+    What a thread's AuthorizedHttp sees instead of the real credentials:
+    authorizing a request only reads the shared token, and a refresh (after
+    a 401) goes through the manager so only one thread actually refreshes.
+    googleapiclient's batch requests check credentials they do not recognise
+    through the oauth2client attributes (access_token, access_token_expired),
+    so those are provided as well.
+    """
+
+    def __init__(self, manager):
+        self.manager = manager
+        self._local = threading.local()
+
+    @property
+    def valid(self):
+        return self.manager.valid
+
+    @property
+    def access_token(self):
+        return self.manager.token
+
+    @property
+    def access_token_expired(self):
+        return not self.manager.valid
+
+    def apply(self, headers, token=None):
+        self.manager.ensure_fresh()
+        self._local.token = self.manager.creds.token
+        self.manager.creds.apply(headers)
+
+    def before_request(self, request, method, url, headers):
+        self.apply(headers)
+
+    def refresh(self, request):
+        self.manager.refresh(stale_token=getattr(self._local, 'token', None))
+
+class CredentialManager:
+    """
+    Owns the OAuth credentials shared by every thread.
+    A background thread refreshes the token REFRESH_MARGIN seconds before it
+    expires; any other refresh (expired token, 401) is single-flight, so
+    callers that notice it at the same time wait for one refresh instead of
+    each starting their own. Threads get their own AuthorizedHttp because
+    httplib2 connections are not thread-safe; `transport` can replace the
+    httplib2.Http underneath it (bench/ serves fake data that way).
+    """
+
+    def __init__(self, creds, margin=REFRESH_MARGIN, transport=None):
+        self.creds = creds
+        self.transport = transport
+        self.margin = margin + random.uniform(0, REFRESH_JITTER)
+        self.lock = threading.Lock()
+        self._local = threading.local()
+        self._thread = None
+
+    @property
+    def valid(self):
+        return self.creds.valid
+
+    @property
+    def token(self):
+        return self.creds.token
+
+    def seconds_left(self):
+        """Seconds until the access token expires (None if it has no expiry)."""
+        if not self.creds.expiry:
+            return None
+        expiry = self.creds.expiry.replace(tzinfo=datetime.timezone.utc)
+        return (expiry - datetime.datetime.now(datetime.timezone.utc)).total_seconds()
+
+    def ensure_fresh(self):
+        if not self.creds.valid:
+            self.refresh(stale_token=self.creds.token)
+
+    def refresh(self, request=None, stale_token=None):
+        """
+        Refreshes the token unless another caller already replaced `stale_token`.
+        Without a stale token it only refreshes when the token is invalid or due.
+        """
+        with self.lock:
+            if stale_token is not None and self.creds.token != stale_token and self.creds.valid:
+                return
+            if stale_token is None and self.creds.valid and (self.seconds_left() or 0) > self.margin:
+                return
+            if request is None:
+                from google.auth.transport.requests import Request
+                request = Request()
+            start = time.perf_counter()
+            try:
+                self.creds.refresh(request)
+            except Exception:
+                refresh_failures_total.inc()
+                raise
+            finally:
+                refresh_seconds.observe(time.perf_counter() - start)
+            print(f"🔄 [AUTH] Token refreshed, valid for {int(self.seconds_left() or 0)}s.")
+            if not _in_production():
+                try:
+                    with open(TOKEN_FILE, 'wb') as token:
+                        pickle.dump(self.creds, token)
+                except OSError as e:
+                    print(f"⚠️ [AUTH] Could not save refreshed token: {e}")
+
+    def http(self):
+        """Returns the calling thread's AuthorizedHttp, creating it on first use."""
+        http = getattr(self._local, 'http', None)
+        if http is None:
+            import httplib2
+            import google_auth_httplib2
+            base = self.transport() if self.transport else httplib2.Http(timeout=HTTP_TIMEOUT)
+            http = google_auth_httplib2.AuthorizedHttp(_SharedCredentials(self), http=base)
+            self._local.http = http
+        return http
+
+    def start(self):
+        """Starts the background refresher (idempotent)."""
+        global current
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._refresher, daemon=True)
+            self._thread.start()
+            current = self
+        return self
+
+    def _refresher(self):
+        while True:
+            left = self.seconds_left()
+            if left is not None and left <= self.margin:
+                try:
+                    self.refresh()
+                    continue
+                except Exception as e:
+                    print(f"❌ [AUTH] Background token refresh failed: {e}")
+                    time.sleep(30)
+                    continue
+            time.sleep(60 if left is None else min(60, max(1, left - self.margin)))
+
+def get_manager():
+    """authenticate() wrapped in a started CredentialManager."""
+    return CredentialManager(authenticate()).start()
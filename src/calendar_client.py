@@ -1,54 +1,243 @@
-from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
+from concurrent.futures import ThreadPoolExecutor
 import datetime
+import os
+import random
+import threading
+import time
 from dateutil import parser
+try:
+    from .discovery_cache import build
+    from . import auth
+    from . import metrics
+except ImportError:
+    from discovery_cache import build
+    import auth
+    import metrics
 
-def get_upcoming_events(creds, max_results=250, time_min=None, time_max=None):
-    """Fetches upcoming events from ALL available calendars."""
-    service = build('calendar', 'v3', credentials=creds)
+# Calendars fetched concurrently and retry policy for rate-limit / server errors.
+MAX_WORKERS = int(os.environ.get('CALENDAR_MAX_WORKERS', '8'))
+MAX_RETRIES = 5
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# How retries wait out their backoff; bench/ swaps it for a no-op
+retry_sleep = time.sleep
 
-    if not time_min:
-        time_min = datetime.datetime.now(datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
-    
-    # 1. Get list of all calendars
+_local = threading.local()
+
+def get_service(creds):
+    """Returns a Calendar service for the calling thread, building it only once."""
+    service = getattr(_local, 'service', None)
+    if service is None or _local.creds is not creds:
+        if isinstance(creds, auth.CredentialManager):
+            service = build('calendar', 'v3', http=creds.http())
+        else:
+            service = build('calendar', 'v3', credentials=creds)
+        _local.service = service
+        _local.creds = creds
+    return service
+
+def execute_with_retry(request):
+    """Executes a request, backing off exponentially (with jitter) on 429 and 5xx responses."""
+    method = getattr(request, 'methodId', 'unknown')
+    for attempt in range(MAX_RETRIES + 1):
+        start = time.perf_counter()
+        try:
+            response = request.execute()
+            metrics.record_api_call('calendar', method, time.perf_counter() - start)
+            return response
+        except HttpError as e:
+            metrics.record_api_call('calendar', method, time.perf_counter() - start, e)
+            if e.resp.status not in RETRY_STATUSES or attempt == MAX_RETRIES:
+                raise
+            delay = min(2 ** attempt, 32) + random.random()
+            print(f"⏳ Calendar API returned {e.resp.status}, retrying in {delay:.1f}s...")
+            retry_sleep(delay)
+        except Exception as e:
+            metrics.record_api_call('calendar', method, time.perf_counter() - start, e)
+            raise
+
+def list_calendars(creds):
     try:
-        calendar_list = service.calendarList().list().execute().get('items', [])
+        return execute_with_retry(get_service(creds).calendarList().list()).get('items', [])
     except Exception as e:
         print(f"❌ Error fetching calendar list: {e}")
-        calendar_list = [{'id': 'primary'}]
+        return [{'id': 'primary'}]
 
-    all_events = []
-    
-    # 2. Fetch events from each calendar
+def fetch_calendar_events(creds, cal_id, time_min, time_max, max_results=None):
+    """Pages through one calendar in order, stopping once max_results events were read."""
+    service = get_service(creds)
+    events = []
+    page_token = None
+    while True:
+        try:
+            events_result = execute_with_retry(service.events().list(
+                calendarId=cal_id,
+                timeMin=time_min,
+                timeMax=time_max,
+                maxResults=250,
+                singleEvents=True,
+                orderBy='startTime',
+                pageToken=page_token
+            ))
+        except Exception as e:
+            print(f"⚠️ Could not sync calendar {cal_id}: {e}")
+            break
+        events.extend(events_result.get('items', []))
+        page_token = events_result.get('nextPageToken')
+        if not page_token or (max_results and len(events) >= max_results):
+            break
+    return events[:max_results] if max_results else events
+
+def get_upcoming_events(creds, max_results=250, time_min=None, time_max=None):
+    """
+    Fetches upcoming events from ALL available calendars, several calendars at a time.
+    max_results caps each calendar's fetch and the final, start-sorted result.
+    """
+    if not time_min:
+        time_min = datetime.datetime.now(datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+
+    # 1. Get list of all calendars
+    calendar_list = list_calendars(creds)
     for cal in calendar_list:
-        cal_id = cal.get('id')
-        print(f"📅 Syncing calendar: {cal.get('summary')} ({cal_id})")
-        
-        page_token = None
-        while True:
+        print(f"📅 Syncing calendar: {cal.get('summary')} ({cal.get('id')})")
+
+    # 2. Fetch events from each calendar concurrently; results keep calendar order
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        per_calendar = executor.map(
+            lambda cal: fetch_calendar_events(creds, cal.get('id'), time_min, time_max, max_results),
+            calendar_list
+        )
+        all_events = [e for events in per_calendar for e in events]
+
+    # Remove duplicates (events can appear in multiple calendars)
+    unique_events = {e['id']: e for e in all_events}.values()
+    ordered = sorted(unique_events, key=lambda x: _event_bounds(x)[0])
+    return ordered[:max_results] if max_results else ordered
+
+def _to_epoch(iso_str):
+    dt = parser.parse(iso_str)
+    if dt.tzinfo is None: dt = dt.replace(tzinfo=datetime.timezone.utc)
+    return dt.timestamp()
+
+def _event_bounds(event):
+    """Returns (start, end) of an event as UTC epoch seconds."""
+    start, end = event['start'], event['end']
+    return _to_epoch(start.get('dateTime', start.get('date'))), _to_epoch(end.get('dateTime', end.get('date')))
+
+class CalendarSync:
+    """
+    Incremental replacement for get_upcoming_events.
+    The first call does a full sync of every calendar over a window slightly
+    larger than requested and keeps each calendar's nextSyncToken. Later calls
+    only ask for changed/deleted events and apply them to an in-memory store
+    keyed by event id. A 410 Gone (expired token) or a requested window that
+    outgrows the synced one falls back to a full sync.
+    """
+
+    def __init__(self, horizon_hours=6):
+        self.horizon = datetime.timedelta(hours=horizon_hours)
+        self.tokens = {}
+        self.store = {}
+        self.window = None
+        self.version = 0
+        self.lock = threading.Lock()
+
+    def sync(self, creds, time_min, time_max):
+        with self.lock:
+            try:
+                calendar_list = execute_with_retry(get_service(creds).calendarList().list()).get('items', [])
+            except Exception as e:
+                print(f"❌ Error fetching calendar list: {e}")
+                calendar_list = [{'id': cal_id} for cal_id in self.store] or [{'id': 'primary'}]
+            cal_ids = [cal.get('id') for cal in calendar_list]
+            self._prepare(cal_ids, time_min, time_max)
+
+            with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+                results = executor.map(lambda cal_id: self._sync_calendar(creds, cal_id), cal_ids)
+                for cal_id, result in zip(cal_ids, results):
+                    if result is not None:
+                        self._apply(cal_id, *result)
+
+            return self.events(time_min, time_max)
+
+    def _prepare(self, cal_ids, time_min, time_max):
+        """Widens the synced window if needed (forcing a full sync) and drops calendars that went away."""
+        if self.window is None or time_min < self.window[0] or time_max > self.window[1]:
+            end = parser.parse(time_max) + self.horizon
+            self.window = (time_min, end.strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z')
+            self.tokens.clear()
+            self.store.clear()
+            print(f"🔄 Full calendar sync over {self.window[0]} to {self.window[1]}")
+
+        for cal_id in list(self.store):
+            if cal_id not in cal_ids:
+                del self.store[cal_id]
+                self.tokens.pop(cal_id, None)
+                self.version += 1
+
+    def events(self, time_min, time_max):
+        """Returns the stored events overlapping [time_min, time_max], deduplicated and sorted."""
+        lo, hi = _to_epoch(time_min), _to_epoch(time_max)
+        unique_events = {}
+        for cal_events in self.store.values():
+            for event_id, (event, start, end) in cal_events.items():
+                if end > lo and start < hi:
+                    unique_events[event_id] = (start, event)
+        return [event for _, event in sorted(unique_events.values(), key=lambda x: x[0])]
+
+    def _sync_calendar(self, creds, cal_id):
+        """Runs on a worker thread. Returns (is_full, items, next_sync_token) or None on failure."""
+        token = self.tokens.get(cal_id)
+        if token:
             try:
-                events_result = service.events().list(
-                    calendarId=cal_id, 
-                    timeMin=time_min,
-                    timeMax=time_max,
-                    maxResults=250, 
-                    singleEvents=True,
-                    orderBy='startTime',
-                    pageToken=page_token
-                ).execute()
-                
-                items = events_result.get('items', [])
-                all_events.extend(items)
-                
-                page_token = events_result.get('nextPageToken')
-                if not page_token or len(all_events) >= max_results:
-                    break
+                return (False,) + self._list(creds, cal_id, syncToken=token)
+            except HttpError as e:
+                if e.resp.status != 410:
+                    print(f"⚠️ Could not sync calendar {cal_id}: {e}")
+                    return None
+                print(f"♻️ Sync token expired for {cal_id}, running full sync.")
             except Exception as e:
                 print(f"⚠️ Could not sync calendar {cal_id}: {e}")
-                break
-            
-    # Remove duplicates (events can appear in multiple calendars)
-    unique_events = {e['id']: e for e in all_events}.values()
-    return sorted(unique_events, key=lambda x: x['start'].get('dateTime', x['start'].get('date')))
+                return None
+        try:
+            return (True,) + self._list(creds, cal_id, timeMin=self.window[0], timeMax=self.window[1])
+        except Exception as e:
+            print(f"⚠️ Could not sync calendar {cal_id}: {e}")
+            return None
+
+    def _list(self, creds, cal_id, **params):
+        service = get_service(creds)
+        items = []
+        page_token = None
+        while True:
+            result = execute_with_retry(service.events().list(
+                calendarId=cal_id,
+                maxResults=250,
+                singleEvents=True,
+                pageToken=page_token,
+                **params
+            ))
+            items.extend(result.get('items', []))
+            page_token = result.get('nextPageToken')
+            if not page_token:
+                return items, result.get('nextSyncToken')
+
+    def _apply(self, cal_id, is_full, items, token):
+        if is_full:
+            self.store[cal_id] = {}
+        events = self.store.setdefault(cal_id, {})
+        for event in items:
+            if event.get('status') == 'cancelled':
+                events.pop(event['id'], None)
+            else:
+                events[event['id']] = (event,) + _event_bounds(event)
+        self.tokens[cal_id] = token
+        if is_full or items:
+            self.version += 1
+        if is_full:
+            print(f"📅 Synced calendar {cal_id}: {len(events)} events")
+        elif items:
+            print(f"📅 {len(items)} changed events in calendar {cal_id}")
 
 def extract_meet_link(event):
     """Extracts the Google Meet link/code from a calendar event."""
@@ -0,0 +1,66 @@
+import sqlite3
+import threading
+import time
+
+class ConferenceCache:
+    """
+    Maps a Meet code to its active conference record name ('conferenceRecords/{id}')
+    so the records.list lookup is skipped while a meeting is running.
+    Entries expire after `ttl` seconds and are dropped as soon as the record is
+    seen with an endTime. With a `path`, entries are also kept in SQLite so a
+    restarted server does not have to re-resolve every meeting.
+    """
+
+    def __init__(self, ttl=600, path=None):
+        self.ttl = ttl
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.db = None
+        if path:
+            self.db = sqlite3.connect(path, check_same_thread=False)
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS conference_records ("
+                "meeting_code TEXT PRIMARY KEY, record_name TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self.db.execute("DELETE FROM conference_records WHERE expires_at <= ?", (time.time(),))
+            self.db.commit()
+            for code, name, expires_at in self.db.execute("SELECT meeting_code, record_name, expires_at FROM conference_records"):
+                self.entries[code] = (name, expires_at)
+
+    def get(self, code):
+        with self.lock:
+            entry = self.entries.get(code)
+            if entry and entry[1] > time.time():
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+        if entry:
+            self.invalidate(code)
+        return None
+
+    def put(self, code, record):
+        """Caches a conference record resource; ended records are invalidated instead."""
+        if record.get('endTime'):
+            self.invalidate(code)
+            return
+        expires_at = time.time() + self.ttl
+        with self.lock:
+            self.entries[code] = (record['name'], expires_at)
+            if self.db:
+                self.db.execute(
+                    "INSERT OR REPLACE INTO conference_records VALUES (?, ?, ?)",
+                    (code, record['name'], expires_at)
+                )
+                self.db.commit()
+
+    def invalidate(self, code):
+        with self.lock:
+            if self.entries.pop(code, None) and self.db:
+                self.db.execute("DELETE FROM conference_records WHERE meeting_code = ?", (code,))
+                self.db.commit()
+
+    def stats(self):
+        with self.lock:
+            return {"size": len(self.entries), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,56 @@
+import json
+import os
+import threading
+import urllib.request
+
+# Documents not bundled with google-api-python-client are downloaded once and kept here
+CACHE_DIR = os.environ.get('DISCOVERY_CACHE_DIR', '.discovery_cache')
+DISCOVERY_URL = 'https://{api}.googleapis.com/$discovery/rest?version={version}'
+
+_documents = {}
+_lock = threading.Lock()
+
+def document(api, version):
+    """
+    Parsed discovery document for api/version, loaded once per process from
+    the on-disk cache, the copy bundled with googleapiclient, or (only the
+    first time ever) the discovery endpoint.
+    """
+    key = f"{api}.{version}"
+    with _lock:
+        doc = _documents.get(key)
+        if doc is None:
+            doc = _documents[key] = _load(api, version, key)
+        return doc
+
+def _load(api, version, key):
+    path = os.path.join(CACHE_DIR, key + '.json')
+    if os.path.exists(path):
+        try:
+            with open(path, 'rb') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ [DISCOVERY] Ignoring unreadable {path}: {e}")
+
+    from googleapiclient import discovery_cache
+    content = discovery_cache.get_static_doc(api, version)
+    if content:
+        return json.loads(content)
+
+    print(f"🌐 [DISCOVERY] Downloading the {api} {version} discovery document...")
+    with urllib.request.urlopen(DISCOVERY_URL.format(api=api, version=version), timeout=30) as response:
+        content = response.read()
+    doc = json.loads(content)
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with open(path + '.tmp', 'wb') as f:
+            f.write(content)
+        os.replace(path + '.tmp', path)
+    except OSError as e:
+        print(f"⚠️ [DISCOVERY] Could not cache {path}: {e}")
+    return doc
+
+def build(api, version, **kwargs):
+    """googleapiclient.discovery.build from the cached document; never reads or fetches discovery twice."""
+    from googleapiclient.discovery import build_from_document
+    return build_from_document(document(api, version), **kwargs)
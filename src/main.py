@@ -1,114 +1,160 @@
 import auth
 import calendar_client
 import meet_client
-import sys
+from conference_cache import ConferenceCache
+import argparse
 import datetime
-import time
 import os
-from concurrent.futures import ThreadPoolExecutor
-from dateutil import parser
+import time
+from concurrent.futures import as_completed
+
+# Sessions starting within this window count as upcoming
+UPCOMING_WINDOW = 10 * 60
 
 def clear_screen():
     os.system('cls' if os.name == 'nt' else 'clear')
 
-def get_session_attendance(creds, event, now_dt):
-    """Worker function to fetch attendance for a single session."""
-    summary = event.get('summary', 'No Title')
-    start_str = event['start'].get('dateTime', event['start'].get('date'))
-    end_str = event['end'].get('dateTime', event['end'].get('date'))
-    
-    start_dt = parser.parse(start_str)
-    end_dt = parser.parse(end_str)
-    
-    if start_dt.tzinfo is None:
-        start_dt = start_dt.replace(tzinfo=datetime.timezone.utc)
-    else:
-        start_dt = start_dt.astimezone(datetime.timezone.utc)
-
-    if end_dt.tzinfo is None:
-        end_dt = end_dt.replace(tzinfo=datetime.timezone.utc)
-    else:
-        end_dt = end_dt.astimezone(datetime.timezone.utc)
-    
-    monitor_start = now_dt + datetime.timedelta(minutes=10)
-    is_active = (start_dt <= now_dt <= end_dt)
-    is_upcoming = (now_dt < start_dt <= monitor_start)
-
-    if not (is_active or is_upcoming):
-        return None
-
-    status = "[ACTIVE]" if is_active else "[UPCOMING]"
-    result = {
-        "summary": summary,
-        "status": status,
-        "schedule": f"{start_dt.strftime('%H:%M')} - {end_dt.strftime('%H:%M')}",
-        "participants": "No Meet link",
-        "has_link": False
-    }
-
-    meet_link = calendar_client.extract_meet_link(event)
-    if meet_link:
-        result["has_link"] = True
-        conf_code = meet_link.split('/')[-1].split('?')[0]
-        filter_query = f'space.meeting_code="{conf_code}"'
-        
-        records = meet_client.list_conference_records(creds, filter_query=filter_query)
+def day_range(now_dt):
+    start_of_day = now_dt.replace(hour=0, minute=0, second=0, microsecond=0)
+    end_of_day = start_of_day + datetime.timedelta(days=1)
+    time_min = start_of_day.strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+    time_max = end_of_day.strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+    return start_of_day, time_min, time_max
+
+class CalendarCache:
+    """
+    Today's events with their start/end parsed once. The calendar is synced
+    incrementally every `interval` seconds instead of on every refresh.
+    """
+
+    def __init__(self, creds, interval):
+        self.creds = creds
+        self.interval = interval
+        self.sync = calendar_client.CalendarSync()
+        self.day = None
+        self.fetched_at = 0
+        self.events = []
+
+    def get(self, now_dt):
+        day, time_min, time_max = day_range(now_dt)
+        if day != self.day or time.time() - self.fetched_at >= self.interval:
+            if day != self.day:
+                self.sync = calendar_client.CalendarSync()
+                self.day = day
+            events = self.sync.sync(self.creds, time_min, time_max)
+            self.events = [(event,) + calendar_client._event_bounds(event) for event in events]
+            self.fetched_at = time.time()
+        return self.events
+
+def due_sessions(events, now):
+    """Active sessions and those starting within UPCOMING_WINDOW, as (event, start, end, status)."""
+    due = []
+    for event, start, end in events:
+        if start <= now <= end:
+            due.append((event, start, end, "[ACTIVE]"))
+        elif now < start <= now + UPCOMING_WINDOW:
+            due.append((event, start, end, "[UPCOMING]"))
+    return due
+
+def session_participants(creds, conf_cache, meet_link):
+    """One line describing who is in the meeting behind meet_link."""
+    conf_code = meet_link.split('/')[-1].split('?')[0]
+    conf_id = conf_cache.get(conf_code)
+    if not conf_id:
+        records = meet_client.find_conference_records(creds, conf_code, running_only=True)
         if not records:
-            result["participants"] = "No active conference detected."
-        else:
-            record = records[0]
-            conf_id = record.get('name')
-            participants = meet_client.get_participants(creds, conf_id)
-            
-            if not participants:
-                result["participants"] = "Waiting for participants..."
-            else:
-                names = [p.get('signedinUser', {}).get('displayName', 'Unknown/Anonymous') for p in participants]
-                result["participants"] = f"Participants ({len(names)}): {', '.join(names)}"
-    
-    return result
+            return "No active conference detected."
+        records.sort(key=lambda r: r.get('startTime', ''), reverse=True)
+        record = next((r for r in records if not r.get('endTime')), records[0])
+        conf_cache.put(conf_code, record)
+        conf_id = record.get('name')
+    # Only people still in the call; those who left are not listed as participants
+    participants = meet_client.get_participants(creds, conf_id, active_only=True)
+    if not participants:
+        # The conference may have ended; re-resolve next time in case a new one started on the code
+        conf_cache.invalidate(conf_code)
+        return "Waiting for participants..."
+    names = [p.get('signedinUser', {}).get('displayName', 'Unknown/Anonymous') for p in participants]
+    return f"Participants ({len(names)}): {', '.join(names)}"
+
+def render(event, start, end, status, participants):
+    start_dt = datetime.datetime.fromtimestamp(start, datetime.timezone.utc)
+    end_dt = datetime.datetime.fromtimestamp(end, datetime.timezone.utc)
+    return "\n".join([
+        f"{status} {event.get('summary', 'No Title')}",
+        f"  Schedule: {start_dt.strftime('%H:%M')} - {end_dt.strftime('%H:%M')}",
+        f"  {participants}",
+        "-" * 40
+    ])
+
+class Monitor:
+    """
+    Polls the due sessions every `refresh` seconds and prints a session only
+    when its rendered block changed, as soon as its lookup completes.
+    """
+
+    def __init__(self, creds, refresh, calendar_interval):
+        self.creds = creds
+        self.refresh = refresh
+        self.calendar = CalendarCache(creds, calendar_interval)
+        self.conf_cache = ConferenceCache(ttl=600)
+        self.shown = {}
+        self.idle = False
+
+    def tick(self):
+        now_dt = datetime.datetime.now(datetime.timezone.utc)
+        due = due_sessions(self.calendar.get(now_dt), now_dt.timestamp())
+        stamp = now_dt.strftime('%H:%M:%S')
+
+        current = set()
+        futures = {}
+        for event, start, end, status in due:
+            current.add(event['id'])
+            link = calendar_client.extract_meet_link(event)
+            if not link:
+                self.show(event['id'], render(event, start, end, status, "No Meet link"), stamp)
+                continue
+            future = meet_client.get_executor().submit(session_participants, self.creds, self.conf_cache, link)
+            futures[future] = (event, start, end, status)
+        for future in as_completed(futures):
+            event, start, end, status = futures[future]
+            try:
+                participants = future.result()
+            except Exception as e:
+                participants = f"Error: {e}"
+            self.show(event['id'], render(event, start, end, status, participants), stamp)
+
+        for event_id in [e for e in self.shown if e not in current]:
+            print(f"[{stamp}] ✖ {self.shown.pop(event_id).splitlines()[0]} is no longer active.")
+        if not due and not self.idle:
+            print(f"[{stamp}] No sessions are currently active or starting within 10 minutes.")
+        self.idle = not due
+
+    def show(self, event_id, block, stamp):
+        if self.shown.get(event_id) != block:
+            self.shown[event_id] = block
+            print(f"[{stamp}] {block}")
+
+    def run(self):
+        clear_screen()
+        print(f"=== Meet Monitor - refreshing every {self.refresh:g}s, only changes are printed (Ctrl+C to stop) ===\n")
+        while True:
+            started = time.time()
+            self.tick()
+            time.sleep(max(0.0, self.refresh - (time.time() - started)))
 
 def main():
+    ap = argparse.ArgumentParser(description="Terminal monitor for today's Meet sessions.")
+    ap.add_argument('--refresh', type=float, default=float(os.environ.get('CLI_REFRESH_SECONDS', '5')),
+                    help='seconds between attendance polls (default 5)')
+    ap.add_argument('--calendar-refresh', type=float, default=float(os.environ.get('CLI_CALENDAR_SECONDS', '120')),
+                    help='seconds between calendar syncs (default 120)')
+    args = ap.parse_args()
     try:
         print("Authenticating...")
-        creds = auth.authenticate()
+        creds = auth.get_manager()
         print("Authentication successful.")
-
-        while True:
-            now_dt = datetime.datetime.now(datetime.timezone.utc)
-            start_of_day = now_dt.replace(hour=0, minute=0, second=0, microsecond=0)
-            end_of_day = start_of_day + datetime.timedelta(days=1)
-            
-            time_min = start_of_day.strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
-            time_max = end_of_day.strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
-
-            # Fetch events (increased to 250)
-            events = calendar_client.get_upcoming_events(creds, max_results=250, time_min=time_min, time_max=time_max)
-            
-            clear_screen()
-            print(f"=== Meet Monitor - {now_dt.strftime('%Y-%m-%d %H:%M:%S')} UTC ===")
-            print(f"Monitoring today's sessions ({start_of_day.date()})\n")
-
-            if not events:
-                print("No sessions found for today.")
-            else:
-                # Use ThreadPoolExecutor to check attendance in parallel
-                with ThreadPoolExecutor(max_workers=10) as executor:
-                    futures = [executor.submit(get_session_attendance, creds, event, now_dt) for event in events]
-                    results = [f.result() for f in futures if f.result() is not None]
-
-                if not results:
-                    print("No sessions are currently active or starting within 10 minutes.")
-                else:
-                    for res in results:
-                        print(f"{res['status']} {res['summary']}")
-                        print(f"  Schedule: {res['schedule']}")
-                        print(f"  {res['participants']}")
-                        print("-" * 40)
-
-            print(f"\nNext update in 30 seconds... (Ctrl+C to stop)")
-            time.sleep(30)
-
+        Monitor(creds, args.refresh, args.calendar_refresh).run()
     except KeyboardInterrupt:
         print("\nMonitoring stopped.")
     except Exception as e:
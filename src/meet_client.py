@@ -1,33 +1,171 @@
-from googleapiclient.discovery import build
+from concurrent.futures import ThreadPoolExecutor
+import os
+import threading
+import time
+try:
+    from .discovery_cache import build
+    from . import auth
+    from .scheduler import RateLimiter
+    from . import metrics
+except ImportError:
+    from discovery_cache import build
+    import auth
+    from scheduler import RateLimiter
+    import metrics
+
+# Upper bound on concurrent Meet API calls made through submit().
+MAX_WORKERS = int(os.environ.get('MEET_MAX_WORKERS', '30'))
+# Sub-requests per HTTP batch call (the API accepts at most 1000, 100 keeps responses small).
+BATCH_LIMIT = int(os.environ.get('MEET_BATCH_LIMIT', '100'))
+# Page size for list calls (conference records accept at most 100, participants 250).
+PAGE_SIZE = int(os.environ.get('MEET_PAGE_SIZE', '100'))
+# Server-side filter for participants that have not left the call yet.
+ACTIVE_FILTER = 'latest_end_time IS NULL'
+# Server-side filter for conference records that have not ended.
+RUNNING_FILTER = 'end_time IS NULL'
+# Global Meet API budget in requests per second (batch sub-requests count individually).
+# Off by default: set it to the project's Meet read quota (per minute / 60) when sharing that quota.
+rate_limiter = RateLimiter(float(os.environ.get('MEET_RPS', '0')))
+
+_local = threading.local()
+_executor = None
+_executor_lock = threading.Lock()
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+def get_service(creds):
+    """
+    Returns a Meet service for the calling thread, building it only once.
+    httplib2 connections are not thread-safe, so each thread keeps its own.
+    """
+    service = getattr(_local, 'service', None)
+    if service is None or _local.creds is not creds:
+        if isinstance(creds, auth.CredentialManager):
+            service = build('meet', 'v2', http=creds.http())
+        else:
+            service = build('meet', 'v2', credentials=creds)
+        _local.service = service
+        _local.creds = creds
+    return service
+
+def get_executor():
+    """Returns the shared, long-lived worker pool for Meet API calls."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix='meet')
+        return _executor
+
+def submit(key, fn, *args):
+    """
+    Runs fn(*args) on the shared pool. Callers asking for the same key while
+    a call is still running get the existing future instead of a new request.
+    """
+    with _inflight_lock:
+        future = _inflight.get(key)
+        if future is not None:
+            return future
+        future = get_executor().submit(fn, *args)
+        _inflight[key] = future
+
+    def _done(f):
+        with _inflight_lock:
+            if _inflight.get(key) is f:
+                del _inflight[key]
+    future.add_done_callback(_done)
+    return future
+
+def cancel(key):
+    """Cancels a submit() call that has not started running yet; returns True if it was cancelled."""
+    with _inflight_lock:
+        future = _inflight.get(key)
+    return future.cancel() if future is not None else False
+
+def _execute(request, cost=1):
+    rate_limiter.acquire(cost)
+    method = getattr(request, 'methodId', None) or 'batch'
+    start = time.perf_counter()
+    try:
+        response = request.execute()
+    except Exception as e:
+        metrics.record_api_call('meet', method, time.perf_counter() - start, e)
+        raise
+    metrics.record_api_call('meet', method, time.perf_counter() - start)
+    return response
+
+def _pages(request_fn, key, page_token=None):
+    """Yields the items of every page, requesting the next one only when the previous is consumed."""
+    while True:
+        response = _execute(request_fn(page_token))
+        yield from response.get(key, [])
+        page_token = response.get('nextPageToken')
+        if not page_token:
+            return
+
+def iter_conference_records(creds, filter_query=None, page_size=None):
+    """Streams the conference records matching filter_query across all pages."""
+    records = get_service(creds).conferenceRecords()
+    size = min(page_size or PAGE_SIZE, 100)
+    return _pages(
+        lambda token: records.list(filter=filter_query, pageSize=size, pageToken=token),
+        'conferenceRecords'
+    )
+
+def iter_participants(creds, conference_id, active_only=False, page_size=None, page_token=None):
+    """
+    Streams the participants of a conference record across all pages.
+    active_only asks the API for people still in the call (no latestEndTime)
+    instead of everyone who ever joined.
+    """
+    participants = get_service(creds).conferenceRecords().participants()
+    return _pages(
+        lambda token: participants.list(
+            parent=conference_id,
+            filter=ACTIVE_FILTER if active_only else None,
+            pageSize=page_size or PAGE_SIZE,
+            pageToken=token
+        ),
+        'participants',
+        page_token
+    )
 
 def list_conference_records(creds, filter_query=None):
     """
     Lists conference records.
     Note: Accessing conference records usually requires a Workspace account.
     """
-    service = build('meet', 'v2', credentials=creds)
-    
     print(f"Fetching conference records (filter: {filter_query})...")
     try:
-        # We generally filter by start time or just list all
-        request = service.conferenceRecords().list(filter=filter_query)
-        response = request.execute()
-        return response.get('conferenceRecords', [])
+        return list(iter_conference_records(creds, filter_query))
     except Exception as e:
         print(f"Error fetching conference records: {e}")
         return []
 
-def get_participants(creds, conference_id):
+def find_conference_records(creds, meeting_code, running_only=False):
+    """
+    The records worth resolving a Meet code to: the running conference, found
+    with an end_time filter, else (unless running_only) the latest ended one.
+    Records are listed newest first, so that takes one page instead of the
+    code's whole history.
+    """
+    code_filter = f'space.meeting_code="{meeting_code}"'
+    try:
+        running = list(iter_conference_records(creds, f'{code_filter} AND {RUNNING_FILTER}'))
+        if running or running_only:
+            return running
+        response = _execute(get_service(creds).conferenceRecords().list(filter=code_filter, pageSize=1))
+        return response.get('conferenceRecords', [])
+    except Exception as e:
+        print(f"Error fetching conference records for {meeting_code}: {e}")
+        return []
+
+def get_participants(creds, conference_id, active_only=False):
     """
     Gets the list of participants for a specific conference record.
     conference_id is usually formatted as 'conferenceRecords/{id}'
     """
-    service = build('meet', 'v2', credentials=creds)
-    
     try:
-        request = service.conferenceRecords().participants().list(parent=conference_id)
-        response = request.execute()
-        return response.get('participants', [])
+        return list(iter_participants(creds, conference_id, active_only))
     except Exception as e:
         print(f"Error fetching participants for {conference_id}: {e}")
         return []
@@ -35,14 +173,68 @@ def get_participants(creds, conference_id):
 def get_recordings(creds, conference_id):
     """
     Checks if there are any recordings for a specific conference record.
-    Note: Real-time recording status is limited in the API; this typically finds 
+    Note: Real-time recording status is limited in the API; this typically finds
     ongoing or completed recording resources.
     """
-    service = build('meet', 'v2', credentials=creds)
+    service = get_service(creds)
     try:
         request = service.conferenceRecords().recordings().list(parent=conference_id)
-        response = request.execute()
+        response = _execute(request)
         return response.get('recordings', [])
     except Exception as e:
         # 403 or 404 is common if no recordings exist or feature is disabled
         return []
+
+def batch_get_participants_and_recordings(creds, conference_ids, active_only=False):
+    """
+    Fetches participants and recordings for many conference records using
+    HTTP batch requests of at most BATCH_LIMIT sub-requests each. The first
+    participants page comes from the batch, any further pages are followed after it.
+    Returns {conference_id: {'participants': [...], 'recordings': [...]}}; conferences
+    whose participants could not be fetched are left out, like a failed fetch_meeting.
+    """
+    service = get_service(creds)
+    results = {cid: {'participants': [], 'recordings': []} for cid in conference_ids}
+    failed = set()
+    next_pages = {}
+    calls = []
+    for cid in results:
+        calls.append(('participants', cid, service.conferenceRecords().participants().list(
+            parent=cid, filter=ACTIVE_FILTER if active_only else None, pageSize=PAGE_SIZE
+        )))
+        calls.append(('recordings', cid, service.conferenceRecords().recordings().list(parent=cid)))
+
+    for start in range(0, len(calls), BATCH_LIMIT):
+        chunk = calls[start:start + BATCH_LIMIT]
+
+        def callback(request_id, response, exception, chunk=chunk):
+            kind, cid, _ = chunk[int(request_id)]
+            if exception is not None:
+                metrics.record_api_call('meet', f'conferenceRecords.{kind}.list (batched)', 0.0, exception)
+                # Missing recordings (403/404) are expected, participant errors are not
+                if kind == 'participants':
+                    print(f"Error fetching participants for {cid}: {exception}")
+                    failed.add(cid)
+                return
+            results[cid][kind] = response.get(kind, [])
+            if kind == 'participants' and response.get('nextPageToken'):
+                next_pages[cid] = response['nextPageToken']
+
+        batch = service.new_batch_http_request(callback=callback)
+        for i, (_, _, request) in enumerate(chunk):
+            batch.add(request, request_id=str(i))
+        try:
+            _execute(batch, cost=len(chunk))
+        except Exception as e:
+            print(f"Error executing Meet batch request: {e}")
+            failed.update(cid for _, cid, _ in chunk)
+
+    for cid, token in next_pages.items():
+        if cid in failed:
+            continue
+        try:
+            results[cid]['participants'].extend(iter_participants(creds, cid, active_only, page_token=token))
+        except Exception as e:
+            print(f"Error fetching participants for {cid}: {e}")
+            failed.add(cid)
+    return {cid: data for cid, data in results.items() if cid not in failed}
@@ -0,0 +1,153 @@
+import threading
+import time
+from contextlib import contextmanager
+
+# Latency buckets in seconds, from sub-millisecond lookups to slow API pages
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_registry = []
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra: pairs.append(extra)
+    if not pairs: return ""
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name, self.help, self.labels = name, help_text, tuple(labels)
+        self.values = {}
+        self.lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(l, "") for l in self.labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            items = list(self.values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labels, key)} {value}")
+        return lines
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name, self.help, self.labels = name, help_text, tuple(labels)
+        self.buckets = tuple(buckets)
+        self.values = {}
+        self.lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(l, "") for l in self.labels)
+        with self.lock:
+            entry = self.values.get(key)
+            if entry is None:
+                entry = self.values[key] = [[0] * len(self.buckets), 0, 0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+                    break
+            entry[1] += 1
+            entry[2] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            items = [(key, list(counts), n, total) for key, (counts, n, total) in self.values.items()]
+        for key, counts, n, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, ('le', bound))} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, ('le', '+Inf'))} {n}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {n}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {total}")
+        return lines
+
+class Gauge:
+    """Value read from a callback at scrape time, so the hot path pays nothing."""
+
+    def __init__(self, name, help_text, fn):
+        self.name, self.help, self.fn = name, help_text, fn
+        _registry.append(self)
+
+    def render(self):
+        try:
+            value = self.fn()
+        except Exception:
+            return []
+        # No value (e.g. a token without expiry): leave the metric out rather than write an invalid sample
+        if value is None:
+            return []
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge", f"{self.name} {value}"]
+
+class InstrumentedLock:
+    """threading.Lock that records how long callers waited for it and how long it was held."""
+
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self._acquired_at = 0.0
+
+    def acquire(self, blocking=True, timeout=-1):
+        start = time.perf_counter()
+        acquired = self._lock.acquire(blocking, timeout)
+        if acquired:
+            self._acquired_at = time.perf_counter()
+            lock_wait_seconds.observe(self._acquired_at - start, lock=self.name)
+        return acquired
+
+    def release(self):
+        held = time.perf_counter() - self._acquired_at
+        self._lock.release()
+        lock_hold_seconds.observe(held, lock=self.name)
+
+    def locked(self):
+        return self._lock.locked()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+def render():
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+api_request_seconds = Histogram('papaya_api_request_seconds', 'Google API request latency.', ('api', 'method'))
+api_errors_total = Counter('papaya_api_errors_total', 'Google API requests that failed, by HTTP status.', ('api', 'method', 'status'))
+api_rate_limited_total = Counter('papaya_api_rate_limited_total', 'Google API requests rejected with 429.', ('api',))
+cycle_seconds = Histogram('papaya_cycle_seconds', 'Duration of one background loop iteration.', ('loop',))
+lock_wait_seconds = Histogram('papaya_lock_wait_seconds', 'Time spent waiting to acquire a lock.', ('lock',))
+lock_hold_seconds = Histogram('papaya_lock_hold_seconds', 'Time a lock was held.', ('lock',))
+name_match_seconds = Histogram('papaya_name_match_seconds', 'find_in_db latency.')
+polls_deferred_total = Counter('papaya_polls_deferred_total', 'Due meeting polls carried over to a later tick by the Meet API budget.')
+name_match_total = Counter('papaya_name_match_total', 'find_in_db lookups by outcome.', ('result',))
+
+def record_api_call(api, method, seconds, error=None):
+    """Books one API call; `error` is the raised exception (googleapiclient or httpx), if any."""
+    api_request_seconds.observe(seconds, api=api, method=method)
+    if error is not None:
+        status = getattr(getattr(error, 'resp', None), 'status', None)
+        if status is None:
+            status = getattr(getattr(error, 'response', None), 'status_code', 'error')
+        api_errors_total.inc(api=api, method=method, status=status)
+        if status == 429:
+            api_rate_limited_total.inc(api=api)
@@ -0,0 +1,92 @@
+from array import array
+from functools import lru_cache
+
+NGRAM = 3
+MIN_SUBSTRING_LEN = 4
+MEMO_SIZE = 8192
+
+class NameIndex:
+    """
+    Lookup structure over the roster used by server.find_in_db.
+    Matching follows the same priority as the original linear scans:
+    exact name, then substring (either direction), then >= 2 shared words.
+    Within each rule the earliest roster row wins.
+    """
+
+    def __init__(self, roster, normalize):
+        self.roster = roster
+        self.names = roster.names
+        self.normalize = normalize
+        self.exact = {}
+        self.tokens = {}
+        self.grams = {}
+        for i, name in enumerate(self.names):
+            self.exact.setdefault(name, i)
+            for word in set(name.split()):
+                self.tokens.setdefault(word, []).append(i)
+            if len(name) >= MIN_SUBSTRING_LEN:
+                for gram in {name[j:j + NGRAM] for j in range(len(name) - NGRAM + 1)}:
+                    self.grams.setdefault(gram, []).append(i)
+        # Postings as packed int arrays: a fraction of the memory of lists of ints
+        self.tokens = {k: array('I', v) for k, v in self.tokens.items()}
+        self.grams = {k: array('I', v) for k, v in self.grams.items()}
+        self._init_memo()
+
+    def _init_memo(self):
+        self.match = lru_cache(maxsize=MEMO_SIZE)(self._match)
+
+    def __getstate__(self):
+        # The memo and the normalize function are process-local; the caller restores normalize
+        state = self.__dict__.copy()
+        del state['match']
+        state['normalize'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._init_memo()
+
+    def __len__(self):
+        return len(self.names)
+
+    def _match(self, display_name):
+        norm_display = self.normalize(display_name)
+        if not norm_display: return None
+        idx = self.exact.get(norm_display)
+        if idx is None:
+            idx = self._substring(norm_display)
+        if idx is None:
+            idx = self._overlap(norm_display)
+        return self.roster.entry(idx) if idx is not None else None
+
+    def _substring(self, norm_display):
+        if len(norm_display) < MIN_SUBSTRING_LEN: return None
+        best = None
+        # Roster names contained in the display name: probe every substring.
+        size = len(norm_display)
+        for length in range(MIN_SUBSTRING_LEN, size + 1):
+            for start in range(size - length + 1):
+                idx = self.exact.get(norm_display[start:start + length])
+                if idx is not None and (best is None or idx < best):
+                    best = idx
+        # Display name contained in a roster name: walk the rarest n-gram postings.
+        postings = None
+        for j in range(size - NGRAM + 1):
+            plist = self.grams.get(norm_display[j:j + NGRAM])
+            if plist is None: return best
+            if postings is None or len(plist) < len(postings):
+                postings = plist
+        for idx in postings or ():
+            if best is not None and idx >= best: break
+            if norm_display in self.names[idx]:
+                best = idx
+                break
+        return best
+
+    def _overlap(self, norm_display):
+        counts = {}
+        for word in set(norm_display.split()):
+            for idx in self.tokens.get(word, ()):
+                counts[idx] = counts.get(idx, 0) + 1
+        hits = [idx for idx, n in counts.items() if n >= 2]
+        return min(hits) if hits else None
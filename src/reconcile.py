@@ -0,0 +1,175 @@
+import threading
+import time
+try:
+    from .scheduler import LEAD_TIME, GRACE_TIME
+except ImportError:
+    from scheduler import LEAD_TIME, GRACE_TIME
+
+COUNTERS = ('sessions', 'observed', 'expected', 'present', 'absent', 'unexpected')
+
+def participant_key(participant):
+    """Roster email when the participant was matched, otherwise '~' + display name."""
+    return participant.get('email') or '~' + (participant.get('name') or 'Guest')
+
+class _Session:
+    __slots__ = ('hour', 'code', 'start', 'end', 'expected', 'present', 'unexpected', 'observed', 'fields')
+
+    def __init__(self, hour, code, start, end, expected):
+        self.hour = hour
+        self.code = code
+        self.start = start
+        self.end = end
+        self.expected = expected
+        self.present = set()
+        self.unexpected = set()
+        self.observed = False
+        self.fields = None
+
+    def in_progress(self, now):
+        """Whether a poll at `now` says anything about attendance (LEAD_TIME before start to GRACE_TIME after end)."""
+        return self.start - LEAD_TIME <= now <= self.end + GRACE_TIME
+
+    def counts(self):
+        if not self.observed:
+            return (1, 0, len(self.expected), 0, 0, 0)
+        return (1, 1, len(self.expected), len(self.present), len(self.expected) - len(self.present), len(self.unexpected))
+
+class Reconciler:
+    """
+    Expected (calendar attendees) vs actual (participants matched to roster
+    emails) attendance per session. Each session keeps a hashed set of its
+    expected emails; when a meeting's participants change only the people
+    who joined or left are applied to its sessions' present / unexpected sets,
+    and the per-hour counters are adjusted by the difference. Only polls made
+    while a session is in progress count: sessions that have not started yet
+    stay unobserved, and ended ones keep what was seen while they ran.
+    """
+
+    def __init__(self):
+        self.sessions = {}
+        self.by_code = {}
+        self.live = {}
+        self.hours = {}
+        self.lock = threading.Lock()
+
+    def _add_counts(self, session, sign):
+        totals = self.hours.setdefault(session.hour, dict.fromkeys(COUNTERS, 0))
+        for name, value in zip(COUNTERS, session.counts()):
+            totals[name] += sign * value
+
+    def set_sessions(self, sessions, code_of, now=None):
+        """Syncs with the calendar skeleton; only new or changed sessions are rebuilt."""
+        now = now or time.time()
+        with self.lock:
+            seen = set()
+            for s in sessions:
+                sid = s['id']
+                seen.add(sid)
+                code = code_of(s) if s.get('meetingLink') else None
+                expected = frozenset(a['email'] for a in s.get('attendees', []) if a.get('email'))
+                start, end = s.get('startTs', 0.0), s.get('endTs', 0.0)
+                current = self.sessions.get(sid)
+                if current and (current.hour, current.code, current.start, current.end, current.expected) == (s.get('hour'), code, start, end, expected):
+                    continue
+                if current:
+                    self._remove(sid)
+                session = self.sessions[sid] = _Session(s.get('hour'), code, start, end, expected)
+                if code:
+                    self.by_code.setdefault(code, set()).add(sid)
+                    if code in self.live and session.in_progress(now):
+                        self._apply(session, self.live[code], ())
+                self._add_counts(session, 1)
+            for sid in [sid for sid in self.sessions if sid not in seen]:
+                self._remove(sid)
+
+    def _remove(self, sid):
+        session = self.sessions.pop(sid)
+        self._add_counts(session, -1)
+        if session.code:
+            ids = self.by_code.get(session.code)
+            ids.discard(sid)
+            if not ids:
+                del self.by_code[session.code]
+
+    def _apply(self, session, joined, left):
+        session.observed = True
+        for key in joined:
+            if key in session.expected:
+                session.present.add(key)
+            else:
+                session.unexpected.add(key)
+        for key in left:
+            session.present.discard(key)
+            session.unexpected.discard(key)
+        session.fields = None
+
+    def update_meeting(self, code, participants, now=None):
+        """
+        Applies a meeting's current participants to the sessions using its Meet
+        code that are in progress; one entering its window starts from the full list.
+        Returns whether any session changed.
+        """
+        now = now or time.time()
+        keys = frozenset(participant_key(p) for p in participants)
+        updated = False
+        with self.lock:
+            previous = self.live.get(code)
+            self.live[code] = keys
+            joined = keys - previous if previous is not None else keys
+            left = previous - keys if previous is not None else ()
+            for sid in self.by_code.get(code, ()):
+                session = self.sessions[sid]
+                if not session.in_progress(now) or (session.observed and previous == keys):
+                    continue
+                self._add_counts(session, -1)
+                if session.observed:
+                    self._apply(session, joined, left)
+                else:
+                    self._apply(session, keys, ())
+                self._add_counts(session, 1)
+                updated = True
+        return updated
+
+    def forget_meeting(self, code):
+        """The meeting is no longer polled: its sessions go back to 'not observed'."""
+        with self.lock:
+            if self.live.pop(code, None) is None:
+                return
+            for sid in self.by_code.get(code, ()):
+                session = self.sessions[sid]
+                self._add_counts(session, -1)
+                session.present.clear()
+                session.unexpected.clear()
+                session.observed = False
+                session.fields = None
+                self._add_counts(session, 1)
+
+    def fields(self, sid):
+        """Reconciliation fields for a session object (cached until its sets change)."""
+        with self.lock:
+            session = self.sessions.get(sid)
+            if session is None or not session.observed:
+                return {}
+            if session.fields is None:
+                session.fields = {
+                    "expectedCount": len(session.expected),
+                    "present": sorted(session.present),
+                    "absent": sorted(session.expected - session.present),
+                    "unexpected": sorted(k[1:] if k.startswith('~') else k for k in session.unexpected),
+                }
+            return session.fields
+
+    def summary(self, hours=None):
+        """Per-hour counters plus totals, optionally limited to some hours."""
+        with self.lock:
+            counters = {h: dict(c) for h, c in self.hours.items() if c['sessions']}
+        return summarize(counters, hours)
+
+def summarize(counters, hours=None):
+    """{hour: counters} -> {"hours": ..., "totals": ...} for the selected hours (all if None)."""
+    selected = {h: c for h, c in counters.items() if not hours or h in hours}
+    totals = dict.fromkeys(COUNTERS, 0)
+    for values in selected.values():
+        for name in COUNTERS:
+            totals[name] += values[name]
+    return {"hours": dict(sorted(selected.items(), key=lambda kv: str(kv[0]))), "totals": totals}
@@ -0,0 +1,150 @@
+import csv
+import hashlib
+import os
+import pickle
+import re
+import unicodedata
+try:
+    from .name_index import NameIndex
+except ImportError:
+    from name_index import NameIndex
+
+# (file, name column, type) in priority order: the first row seen for an email wins
+SOURCES = (
+    ('students.csv', 'student_name', 'student'),
+    ('tutors.csv', 'no_id_name', 'tutor'),
+)
+TYPES = tuple(kind for _, _, kind in SOURCES)
+# Bump when Roster/NameIndex layout changes so stale caches are rebuilt
+CACHE_FORMAT = 1
+
+_strip_re = re.compile(r'[^a-z0-9\s,]')
+
+def normalize_name(name):
+    if not name: return ""
+    if not name.isascii():
+        name = "".join(c for c in unicodedata.normalize('NFD', name) if unicodedata.category(c) != 'Mn')
+    name = name.lower()
+    name = _strip_re.sub('', name)
+    if ',' in name:
+        parts = name.split(',')
+        if len(parts) >= 2:
+            name = parts[1].strip() + " " + parts[0].strip()
+    return " ".join(name.split())
+
+class Roster:
+    """
+    Students and tutors stored column-wise: normalized names, emails and a
+    type code per row, instead of one dict per person.
+    """
+
+    def __init__(self):
+        self.names = []
+        self.emails = []
+        self.kinds = bytearray()
+
+    def __len__(self):
+        return len(self.names)
+
+    def add(self, norm_name, email, kind):
+        self.names.append(norm_name)
+        self.emails.append(email)
+        self.kinds.append(kind)
+
+    def entry(self, i):
+        return {'norm_name': self.names[i], 'email': self.emails[i], 'type': TYPES[self.kinds[i]]}
+
+def _valid_email(email, kind):
+    if TYPES[kind] == 'tutor':
+        return email != 'n/a' and not email.startswith('#')
+    return True
+
+def read_csvs(directory='.'):
+    roster = Roster()
+    seen_emails = set()
+    for kind, (filename, name_col, label) in enumerate(SOURCES):
+        path = os.path.join(directory, filename)
+        if not os.path.exists(path):
+            continue
+        try:
+            with open(path, mode='r', encoding='utf-8', newline='') as f:
+                reader = csv.reader(f)
+                header = next(reader, [])
+                name_idx, email_idx = header.index(name_col), header.index('email')
+                width = max(name_idx, email_idx)
+                for row in reader:
+                    if len(row) <= width:
+                        continue
+                    name = row[name_idx]
+                    email = row[email_idx].lower().strip()
+                    if name and email and _valid_email(email, kind) and email not in seen_emails:
+                        roster.add(normalize_name(name), email, kind)
+                        seen_emails.add(email)
+            print(f"📚 Loaded {label}s database.")
+        except Exception as e:
+            print(f"❌ Error loading {filename}: {e}")
+    return roster
+
+def source_signature(directory='.', with_hash=False):
+    """(file, mtime_ns, size[, sha1]) for every roster CSV that exists."""
+    signature = []
+    for filename, _, _ in SOURCES:
+        path = os.path.join(directory, filename)
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        entry = (filename, st.st_mtime_ns, st.st_size)
+        if with_hash:
+            with open(path, 'rb') as f:
+                entry += (hashlib.sha1(f.read()).hexdigest(),)
+        signature.append(entry)
+    return tuple(signature)
+
+def _content_key(signature):
+    return tuple((name, size, digest) for name, _, size, digest in signature)
+
+def load(directory='.', cache_path=None):
+    """
+    Returns (roster, name index, signature). The CSVs are only parsed when the
+    pickled cache is missing or they changed: same mtime and size reuse the
+    cache directly, a touched but identical file is recognized by its hash.
+    """
+    signature = source_signature(directory, with_hash=False)
+    cached = None
+    if cache_path and os.path.exists(cache_path):
+        try:
+            with open(cache_path, 'rb') as f:
+                cached = pickle.load(f)
+            if cached.get('format') != CACHE_FORMAT:
+                cached = None
+        except Exception as e:
+            print(f"⚠️ Ignoring unreadable roster cache: {e}")
+            cached = None
+
+    if cached:
+        cached['index'].normalize = normalize_name
+    if cached and tuple(s[:3] for s in cached['signature']) == signature:
+        print(f"⚡ Roster loaded from cache ({len(cached['roster'])} people).")
+        return cached['roster'], cached['index'], cached['signature']
+
+    full_signature = source_signature(directory, with_hash=True)
+    if cached and _content_key(cached['signature']) == _content_key(full_signature):
+        roster, index = cached['roster'], cached['index']
+        print(f"⚡ Roster unchanged since last build, reusing cache ({len(roster)} people).")
+    else:
+        roster = read_csvs(directory)
+        index = NameIndex(roster, normalize_name)
+    if cache_path:
+        try:
+            tmp_path = cache_path + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                pickle.dump({'format': CACHE_FORMAT, 'signature': full_signature, 'roster': roster, 'index': index}, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, cache_path)
+        except Exception as e:
+            print(f"⚠️ Could not write roster cache: {e}")
+    return roster, index, full_signature
+
+def changed_since(signature, directory='.'):
+    """True when any roster CSV was added, removed or modified after `signature` was taken."""
+    return tuple(s[:3] for s in signature) != source_signature(directory)
@@ -0,0 +1,112 @@
+import heapq
+import os
+import threading
+import time
+
+# Poll intervals in seconds (see next_poll_delay)
+FAST_INTERVAL = float(os.environ.get('POLL_FAST_SECONDS', '10'))
+ACTIVE_INTERVAL = float(os.environ.get('POLL_ACTIVE_SECONDS', '45'))
+ENDED_INTERVAL = float(os.environ.get('POLL_ENDED_SECONDS', '600'))
+# How close to its start a session counts as "starting soon", and how long after its end it is still watched
+LEAD_TIME = 10 * 60
+GRACE_TIME = 15 * 60
+
+def next_poll_delay(start_ts, end_ts, state, changed, now):
+    """
+    Seconds until a meeting should be polled again, or None to stop polling it.
+    Fast while it is about to start or its participants just changed, slower
+    once it is stable, rarely (then never) after it ended.
+    """
+    has_people = bool(state and state.get('participants'))
+    if now < start_ts - LEAD_TIME:
+        return start_ts - LEAD_TIME - now
+    if changed or now < start_ts + LEAD_TIME:
+        return FAST_INTERVAL
+    if now <= end_ts + GRACE_TIME:
+        return ACTIVE_INTERVAL
+    return ENDED_INTERVAL if has_people else None
+
+class RateLimiter:
+    """Token bucket shared by all threads; acquire() blocks until the budget allows the call."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst or max(1.0, rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, n=1):
+        if self.rate <= 0: return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= n or self.tokens >= self.capacity:
+                    self.tokens -= n
+                    return
+                wait = (n - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def reserve(self, n=1):
+        """
+        Non-blocking acquire for asyncio callers: books the tokens right away
+        and returns how many seconds to wait before making the call.
+        """
+        if self.rate <= 0: return 0.0
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= n
+            return max(0.0, -self.tokens / self.rate)
+
+class PollScheduler:
+    """Min-heap of (due time, key). Rescheduling or removing a key lazily invalidates old heap entries."""
+
+    def __init__(self):
+        self._heap = []
+        self._due = {}
+
+    def __contains__(self, key):
+        return key in self._due
+
+    def __len__(self):
+        return len(self._due)
+
+    def keys(self):
+        return list(self._due)
+
+    def schedule(self, key, due):
+        self._due[key] = due
+        heapq.heappush(self._heap, (due, key))
+
+    def remove(self, key):
+        self._due.pop(key, None)
+
+    def next_due(self):
+        while self._heap:
+            due, key = self._heap[0]
+            if self._due.get(key) == due:
+                return due
+            heapq.heappop(self._heap)
+        return None
+
+    def count_due(self, now):
+        return sum(1 for due in self._due.values() if due <= now)
+
+    def pop_due(self, now, limit=None):
+        """Removes and returns the keys due at `now`, most overdue first."""
+        keys = []
+        while self._heap and (limit is None or len(keys) < limit):
+            due, key = self._heap[0]
+            if self._due.get(key) != due:
+                heapq.heappop(self._heap)
+                continue
+            if due > now:
+                break
+            heapq.heappop(self._heap)
+            del self._due[key]
+            keys.append(key)
+        return keys
@@ -1,208 +1,627 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request
 from flask_cors import CORS
 try:
     from . import auth
     from . import calendar_client
     from . import meet_client
+    from .name_index import NameIndex
+    from . import roster as roster_loader
+    from .roster import normalize_name
+    from .snapshot import SnapshotStore
+    from . import scheduler
+    from .conference_cache import ConferenceCache
+    from .attendance_store import AttendanceStore
+    from .shared_state import SharedState
+    from . import reconcile
+    from . import metrics
 except ImportError:
     import auth
     import calendar_client
     import meet_client
+    from name_index import NameIndex
+    import roster as roster_loader
+    from roster import normalize_name
+    from snapshot import SnapshotStore
+    import scheduler
+    from conference_cache import ConferenceCache
+    from attendance_store import AttendanceStore
+    from shared_state import SharedState
+    import reconcile
+    import metrics
+import asyncio
+from concurrent.futures import CancelledError
 import datetime
-from concurrent.futures import ThreadPoolExecutor
+import gzip
+import heapq
+import json
+import math
 from dateutil import parser
 import threading
 import time
-import csv
 import os
-import re
-import unicodedata
+import zlib
 import zoneinfo
 
 # Production Server Config
 app = Flask(__name__, static_folder='../dist', static_url_path='/')
 CORS(app)
+# Send participants/recordings lookups as googleapiclient batch requests
+BATCH_MODE = os.environ.get('MEET_BATCH_MODE', '0') == '1'
+# Opt-in: only download participants still in the call (filtered by the API) and skip ended
+# conferences. Cheaper, but the attendance history then misses anyone who joined and left
+# between polls and records leave times at the poll that notices them, not latestEndTime.
+ACTIVE_PARTICIPANTS_ONLY = os.environ.get('MEET_ACTIVE_PARTICIPANTS_ONLY', '0') == '1'
+# 'incremental' keeps calendars in sync with syncTokens, 'full' re-downloads the whole window
+CALENDAR_SYNC_MODE = os.environ.get('CALENDAR_SYNC_MODE', 'incremental')
+SKELETON_INTERVAL = int(os.environ.get('SKELETON_INTERVAL', '45' if CALENDAR_SYNC_MODE == 'incremental' else '300'))
+# 'threads' runs the loops on daemon threads with worker pools, 'asyncio' on one event loop (needs httpx[http2])
+ENGINE = os.environ.get('MONITOR_ENGINE', 'threads')
+# Upper bound on one scheduler tick's API work and on the idle wait between ticks
+MAX_TICK_SECONDS = 5
+MAX_IDLE_WAIT = 5
+# After a /sync-config wake-up, wait this long so a burst of changes is handled by one tick
+CONFIG_COALESCE = float(os.environ.get('CONFIG_COALESCE_SECONDS', '0.25'))
+# Meet API calls made to refresh one meeting (records, participants, recordings)
+CALLS_PER_POLL = 3
+last_deferred_warning = 0.0
 
 # Global storage
 calendar_skeleton = []
+skeleton_by_hour = {}
 enriched_sessions = []
+DELTA_HISTORY = int(os.environ.get('DELTA_HISTORY', '120'))
+snapshots = SnapshotStore(history=DELTA_HISTORY)
 active_timeframes = [] 
 creds = None
-lock = threading.Lock()
-name_db = []
-
-def normalize_name(name):
-    if not name: return ""
-    name = "".join(c for c in unicodedata.normalize('NFD', name) if unicodedata.category(c) != 'Mn')
-    name = name.lower()
-    name = re.sub(r'[^a-z0-9\s,]', '', name)
-    if ',' in name:
-        parts = name.split(',')
-        if len(parts) >= 2:
-            name = parts[1].strip() + " " + parts[0].strip()
-    return " ".join(name.split())
+lock = metrics.InstrumentedLock('server')
+# Set when the selected timeframes change, so the monitor wakes up without waiting for its next poll
+config_changed = threading.Event()
+calendar_sync = calendar_client.CalendarSync()
+poll_scheduler = scheduler.PollScheduler()
+meeting_states = {}
+reconciler = reconcile.Reconciler()
+conference_cache = ConferenceCache(
+    ttl=int(os.environ.get('CONFERENCE_CACHE_TTL', '600')),
+    path=os.environ.get('CONFERENCE_CACHE_PATH')
+)
+# Attendance history database; set ATTENDANCE_DB_PATH="" to disable recording
+ATTENDANCE_DB_PATH = os.environ.get('ATTENDANCE_DB_PATH', 'attendance.sqlite3')
+attendance_store = AttendanceStore(ATTENDANCE_DB_PATH) if ATTENDANCE_DB_PATH else None
+# 'all' polls and serves from one process. Behind gunicorn, one 'poller' and any number of
+# 'web' workers share SHARED_STATE_PATH; with 'auto' the worker that takes the lock polls.
+ROLE = os.environ.get('MONITOR_ROLE', 'all')
+SHARED_STATE_PATH = os.environ.get('SHARED_STATE_PATH', 'shared_state.sqlite3')
+SHARED_SYNC_INTERVAL = float(os.environ.get('SHARED_SYNC_SECONDS', '0.5'))
+shared_state = SharedState(SHARED_STATE_PATH, history=DELTA_HISTORY) if ROLE != 'all' else None
+polling = False
+ROSTER_CACHE_PATH = os.environ.get('ROSTER_CACHE_PATH', '.roster_cache.pickle')
+# Last published skeleton, so a restarted instance has sessions to serve before its first sync; "" disables it
+SKELETON_CACHE_PATH = os.environ.get('SKELETON_CACHE_PATH', '.skeleton_cache.json')
+# Startup phases reported by /ready: {name: {"state", "seconds", "at"}}, "at" counted from process start
+STARTED_AT = time.time()
+startup_phases = {}
+roster_ready = threading.Event()
+roster = roster_loader.Roster()
+name_index = NameIndex(roster, normalize_name)
+roster_signature = None
+CENTRAL_TZ = zoneinfo.ZoneInfo("America/Chicago")
 
 def load_databases():
-    global name_db
-    db = []
-    seen_emails = set()
-    if os.path.exists('students.csv'):
+    global roster, name_index, roster_signature
+    new_roster, new_index, signature = roster_loader.load(cache_path=ROSTER_CACHE_PATH)
+    roster, name_index, roster_signature = new_roster, new_index, signature
+    print(f"🔎 Indexed {len(name_index)} roster names.")
+
+def load_roster():
+    try:
+        load_databases()
+    finally:
+        # Matching against an empty index would report everyone as unknown, so the monitor waits for this
+        roster_ready.set()
+
+def reload_roster_if_changed():
+    """Rebuilds the roster and name index when students.csv/tutors.csv change on disk."""
+    if roster_signature is not None and roster_loader.changed_since(roster_signature):
+        print("♻️ Roster files changed, reloading...")
+        load_databases()
+
+def find_in_db(display_name):
+    start = time.perf_counter()
+    match = name_index.match(display_name)
+    metrics.name_match_seconds.observe(time.perf_counter() - start)
+    metrics.name_match_total.inc(result="hit" if match else "miss")
+    return match
+
+def parse_ts(iso_str):
+    """Parses an ISO date or datetime into UTC epoch seconds (naive values are UTC)."""
+    dt = parser.parse(iso_str)
+    if dt.tzinfo is None: dt = dt.replace(tzinfo=datetime.timezone.utc)
+    return dt.timestamp()
+
+def hour_label(ts):
+    return f"{datetime.datetime.fromtimestamp(ts, CENTRAL_TZ).hour:02d}:00"
+
+def start_key(session):
+    return session["startTs"]
+
+def meeting_code(meeting_link):
+    return meeting_link.split('/')[-1].split('?')[0]
+
+def resolve_conference(conf_code):
+    """Returns the conference record name currently (or last) used by a Meet code."""
+    cached = conference_cache.get(conf_code)
+    if cached:
+        return cached
+    records = meet_client.find_conference_records(creds, conf_code, running_only=ACTIVE_PARTICIPANTS_ONLY)
+    return remember_conference(conf_code, records)
+
+def remember_conference(conf_code, records):
+    """Picks the running (else the latest) conference record, caches and returns its name."""
+    records.sort(key=lambda r: r.get('startTime', ''), reverse=True)
+    active_record = next((r for r in records if not r.get('endTime')), records[0] if records else None)
+    if not active_record:
+        return None
+    if ACTIVE_PARTICIPANTS_ONLY and active_record.get('endTime'):
+        # Nobody can still be in an ended call: IDLE without spending participants/recordings calls
+        return None
+    conference_cache.put(conf_code, active_record)
+    return active_record.get('name')
+
+def meeting_state(conf_code, conf_id, p_data, recs):
+    active_p = []
+    history = []
+    for p in p_data:
+        display_name = "Guest"
+        if p.get('signedinUser'): display_name = p['signedinUser'].get('displayName', 'User')
+        elif p.get('anonymousUser'): display_name = p['anonymousUser'].get('displayName', 'Guest')
+        match = find_in_db(display_name)
+        email = match['email'] if match else None
+        if not p.get('latestEndTime'):
+            active_p.append({"name": display_name, "email": email, "isActive": True})
+        if attendance_store and p.get('name') and p.get('earliestStartTime'):
+            history.append({
+                "id": p['name'],
+                "name": display_name,
+                "email": email,
+                "joined": parse_ts(p['earliestStartTime']),
+                "left": parse_ts(p['latestEndTime']) if p.get('latestEndTime') else None
+            })
+    if attendance_store:
+        attendance_store.record_participants(conf_id, conf_code, history)
+    return {
+        "participants": active_p,
+        "status": "ACTIVE" if active_p else "IDLE",
+        "isRecording": any(not r.get('endTime') for r in recs) if recs else False
+    }
+
+def fetch_meeting(conf_code):
+    """Resolves the live state of one Meet code. Sessions sharing a code share the result."""
+    conf_id = resolve_conference(conf_code)
+    if not conf_id:
+        return {"status": "IDLE", "participants": []}
+    recs = meet_client.get_recordings(creds, conf_id)
+    # Streamed: participants are matched against the roster while later pages are still loading
+    p_data = meet_client.iter_participants(creds, conf_id, active_only=ACTIVE_PARTICIPANTS_ONLY)
+    return meeting_state(conf_code, conf_id, p_data, recs)
+
+def fetch_meetings_batched(conf_codes):
+    """
+    Batched variant of fetch_meeting: resolves every code in parallel, then pulls
+    participants and recordings for all conference records in HTTP batches.
+    """
+    futures = {code: meet_client.submit(('resolve', code), resolve_conference, code) for code in conf_codes}
+    conf_ids = {}
+    states = {}
+    for code, future in futures.items():
         try:
-            with open('students.csv', mode='r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    name = row.get('student_name') or ""
-                    email = (row.get('email') or "").lower().strip()
-                    if name and email and email not in seen_emails:
-                        db.append({'norm_name': normalize_name(name), 'email': email, 'type': 'student'})
-                        seen_emails.add(email)
-            print(f"📚 Loaded students database.")
+            conf_id = future.result()
+        except CancelledError:
+            continue
         except Exception as e:
-            print(f"❌ Error loading students.csv: {e}")
-
-    if os.path.exists('tutors.csv'):
+            print(f"Error resolving {code}: {e}")
+            continue
+        if conf_id:
+            conf_ids[code] = conf_id
+        else:
+            states[code] = {"status": "IDLE", "participants": []}
+    unique_ids = list(dict.fromkeys(conf_ids.values()))
+    chunk = max(1, meet_client.BATCH_LIMIT // 2)
+    batch_futures = [
+        meet_client.get_executor().submit(meet_client.batch_get_participants_and_recordings, creds, unique_ids[i:i + chunk], ACTIVE_PARTICIPANTS_ONLY)
+        for i in range(0, len(unique_ids), chunk)
+    ]
+    results = {}
+    for future in batch_futures:
         try:
-            with open('tutors.csv', mode='r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    name = row.get('no_id_name') or ""
-                    email = (row.get('email') or "").lower().strip()
-                    if name and email and email != 'n/a' and not email.startswith('#') and email not in seen_emails:
-                        db.append({'norm_name': normalize_name(name), 'email': email, 'type': 'tutor'})
-                        seen_emails.add(email)
-            print(f"📚 Loaded tutors database.")
+            results.update(future.result())
         except Exception as e:
-            print(f"❌ Error loading tutors.csv: {e}")
-    name_db = db
+            print(f"Error executing Meet batches: {e}")
+    # Conferences missing from the results failed; finish_tick keeps their state and retries soon
+    for code, conf_id in conf_ids.items():
+        data = results.get(conf_id)
+        if data is not None:
+            states[code] = meeting_state(code, conf_id, data['participants'], data['recordings'])
+    return states
 
-def find_in_db(display_name):
-    norm_display = normalize_name(display_name)
-    if not norm_display: return None
-    for entry in name_db:
-        if entry['norm_name'] == norm_display: return entry
-    for entry in name_db:
-        if entry['norm_name'] in norm_display or norm_display in entry['norm_name']:
-            if len(norm_display) > 3 and len(entry['norm_name']) > 3: return entry
-    display_words = set(norm_display.split())
-    for entry in name_db:
-        db_words = set(entry['norm_name'].split())
-        overlap = display_words.intersection(db_words)
-        if len(overlap) >= 2: return entry
-    return None
-
-def get_hour_label(iso_str):
+def skeleton_range():
+    """The (time_min, time_max) window the skeleton covers: 12h back, 24h ahead."""
+    now_dt = datetime.datetime.now(datetime.timezone.utc)
+    start_range = now_dt - datetime.timedelta(hours=12)
+    end_range = now_dt + datetime.timedelta(hours=24)
+    t_min = start_range.strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+    t_max = end_range.strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+    print(f"🔄 [SKELETON] Syncing range: {t_min} to {t_max}")
+    return t_min, t_max
+
+def sync_skeleton():
+    """Runs one calendar sync and swaps in the rebuilt skeleton."""
+    cycle_start = time.perf_counter()
+    t_min, t_max = skeleton_range()
+    if CALENDAR_SYNC_MODE == 'incremental':
+        events = calendar_sync.sync(creds, t_min, t_max)
+    else:
+        events = calendar_client.get_upcoming_events(creds, max_results=5000, time_min=t_min, time_max=t_max)
+    publish_skeleton(events, cycle_start)
+
+def publish_skeleton(events, cycle_start):
+    """Builds the session skeleton from calendar events, swaps it in and saves it when it changed."""
+    new_skeleton = []
+    for event in events:
+        attendees = []
+        for a in event.get('attendees', []):
+            attendees.append({
+                "email": a.get('email', '').lower(),
+                "name": a.get('displayName', 'No Name'),
+                "response": a.get('responseStatus', 'needsAction')
+            })
+        start_val = event['start'].get('dateTime', event['start'].get('date'))
+        end_val = event['end'].get('dateTime', event['end'].get('date'))
+        try:
+            start_ts, end_ts = parse_ts(start_val), parse_ts(end_val)
+        except (ValueError, OverflowError):
+            start_ts = end_ts = 0.0
+        new_skeleton.append({
+            "id": event.get('id'),
+            "summary": event.get('summary', 'No Title'),
+            "meetingLink": calendar_client.extract_meet_link(event) or "",
+            "startTime": start_val,
+            "endTime": end_val,
+            "startTs": start_ts,
+            "endTs": end_ts,
+            "hour": hour_label(start_ts) if start_ts else "00:00",
+            "attendees": attendees,
+            "participants": [],
+            "isRecording": False,
+            "status": "IDLE"
+        })
+    new_skeleton.sort(key=lambda x: x["startTs"])
+    changed = new_skeleton != calendar_skeleton
+    swap_skeleton(new_skeleton)
+    if attendance_store:
+        attendance_store.record_sessions(new_skeleton, lambda s: meeting_code(s["meetingLink"]))
+    if changed:
+        save_skeleton(new_skeleton)
+    print(f"✅ [SKELETON] {len(calendar_skeleton)} events synced.")
+    metrics.cycle_seconds.observe(time.perf_counter() - cycle_start, loop="skeleton")
+    if "first_sync" not in startup_phases:
+        finish_phase("first_sync", cycle_start)
+
+def swap_skeleton(new_skeleton):
+    """Swaps in a sorted skeleton; the first one is also published as is so there is data to serve."""
+    global calendar_skeleton, skeleton_by_hour, enriched_sessions
+    by_hour = {}
+    for s in new_skeleton:
+        by_hour.setdefault(s["hour"], []).append(s)
+    initial = None
+    with lock:
+        calendar_skeleton = new_skeleton
+        skeleton_by_hour = by_hour
+        if not enriched_sessions and calendar_skeleton:
+            enriched_sessions = initial = [s.copy() for s in calendar_skeleton]
+    if initial: snapshots.publish(initial)
+    reconciler.set_sessions(new_skeleton, lambda s: meeting_code(s["meetingLink"]))
+
+def save_skeleton(sessions):
+    if not SKELETON_CACHE_PATH:
+        return
     try:
-        dt = parser.parse(iso_str)
-        central = zoneinfo.ZoneInfo("America/Chicago")
-        if dt.tzinfo is None: dt = dt.replace(tzinfo=datetime.timezone.utc)
-        dt_central = dt.astimezone(central)
-        return f"{dt_central.hour:02d}:00"
-    except:
-        return "00:00"
+        with open(SKELETON_CACHE_PATH + '.tmp', 'w') as f:
+            json.dump(sessions, f, separators=(',', ':'))
+        os.replace(SKELETON_CACHE_PATH + '.tmp', SKELETON_CACHE_PATH)
+    except OSError as e:
+        print(f"⚠️ [SKELETON] Could not save {SKELETON_CACHE_PATH}: {e}")
+
+def restore_skeleton():
+    """Loads the skeleton saved by the previous run, minus sessions that are already out of the sync window."""
+    if not SKELETON_CACHE_PATH or not os.path.exists(SKELETON_CACHE_PATH):
+        return
+    with open(SKELETON_CACHE_PATH) as f:
+        sessions = json.load(f)
+    oldest = time.time() - 12 * 3600
+    sessions = [s for s in sessions if s["endTs"] >= oldest]
+    with lock:
+        if calendar_skeleton:
+            return
+    swap_skeleton(sessions)
+    print(f"⚡ [STARTUP] Restored {len(sessions)} sessions from {SKELETON_CACHE_PATH}.")
 
 def skeleton_loader():
-    global calendar_skeleton, enriched_sessions, creds
     while True:
         try:
             if not creds:
-                time.sleep(1)
+                time.sleep(0.2)
                 continue
-            now_dt = datetime.datetime.now(datetime.timezone.utc)
-            start_range = now_dt - datetime.timedelta(hours=12)
-            end_range = now_dt + datetime.timedelta(hours=24)
-            t_min = start_range.strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
-            t_max = end_range.strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
-            print(f"🔄 [SKELETON] Syncing range: {t_min} to {t_max}")
-            events = calendar_client.get_upcoming_events(creds, max_results=5000, time_min=t_min, time_max=t_max)
-            new_skeleton = []
-            for event in events:
-                attendees = []
-                for a in event.get('attendees', []):
-                    attendees.append({
-                        "email": a.get('email', '').lower(),
-                        "name": a.get('displayName', 'No Name'),
-                        "response": a.get('responseStatus', 'needsAction')
-                    })
-                start_val = event['start'].get('dateTime', event['start'].get('date'))
-                end_val = event['end'].get('dateTime', event['end'].get('date'))
-                new_skeleton.append({
-                    "id": event.get('id'),
-                    "summary": event.get('summary', 'No Title'),
-                    "meetingLink": calendar_client.extract_meet_link(event) or "",
-                    "startTime": start_val,
-                    "endTime": end_val,
-                    "attendees": attendees,
-                    "participants": [],
-                    "isRecording": False,
-                    "status": "IDLE"
-                })
-            new_skeleton.sort(key=lambda x: parser.parse(x["startTime"]).timestamp())
-            with lock:
-                calendar_skeleton = new_skeleton
-                if not enriched_sessions and calendar_skeleton:
-                    enriched_sessions = [s.copy() for s in calendar_skeleton]
-            print(f"✅ [SKELETON] {len(calendar_skeleton)} events synced.")
+            sync_skeleton()
+            reload_roster_if_changed()
         except Exception as e:
             print(f"❌ [SKELETON] Error: {e}")
-        time.sleep(300)
+        time.sleep(SKELETON_INTERVAL)
+
+def fetch_states(conf_codes):
+    """Enriches a list of Meet codes, returning {code: state} for the ones that succeeded."""
+    if BATCH_MODE:
+        return fetch_meetings_batched(conf_codes)
+    states = {}
+    futures = {code: meet_client.submit(('meeting', code), fetch_meeting, code) for code in conf_codes}
+    for code, future in futures.items():
+        try:
+            states[code] = future.result()
+        except CancelledError:
+            # Its timeframe was deselected while it was queued (see set_timeframes)
+            continue
+        except Exception as e:
+            print(f"Error enriching {code}: {e}")
+    return states
+
+def meeting_windows(sessions):
+    """Maps each Meet code to the (earliest start, latest end) of the sessions using it."""
+    windows = {}
+    for s in sessions:
+        if s["meetingLink"]:
+            code = meeting_code(s["meetingLink"])
+            start, end = windows.get(code, (s["startTs"], s["endTs"]))
+            windows[code] = (min(start, s["startTs"]), max(end, s["endTs"]))
+    return windows
+
+def sync_schedule(windows, now):
+    """
+    Adds newly visible meetings and drops the ones no longer in a selected timeframe.
+    New meetings are due at 0, ahead of everything already queued, so a
+    timeframe that was just selected gets its first data on the next tick.
+    """
+    for code in poll_scheduler.keys():
+        if code not in windows:
+            poll_scheduler.remove(code)
+    for code in list(meeting_states):
+        if code not in windows:
+            del meeting_states[code]
+            reconciler.forget_meeting(code)
+            if attendance_store:
+                attendance_store.close_meeting(code)
+    for code, (start, end) in windows.items():
+        if code in poll_scheduler:
+            continue
+        if code not in meeting_states:
+            poll_scheduler.schedule(code, 0.0)
+        else:
+            delay = scheduler.next_poll_delay(start, end, meeting_states[code], False, now)
+            if delay is not None:
+                poll_scheduler.schedule(code, now + delay)
+
+def attendance_tick(view=None):
+    """
+    Polls the meetings that are due and republishes the snapshot if anything
+    changed. `view` is what the previous tick published; returns (view, seconds
+    until the next meeting is due or None).
+    """
+    cycle_start = time.perf_counter()
+    tick = plan_tick()
+    due = tick[-1]
+    states = fetch_states(due) if due else {}
+    return finish_tick(view, tick, states, cycle_start)
+
+def plan_tick():
+    """Syncs the poll schedule with the selected timeframes and pops the meetings due now."""
+    with lock:
+        current_active = frozenset(active_timeframes)
+        skeleton = calendar_skeleton
+        by_hour = skeleton_by_hour
+    now = time.time()
+    # Bucket lists are already sorted by start, so both sides are k-way merges
+    relevant_sessions = list(heapq.merge(*(by_hour.get(h, []) for h in current_active), key=start_key))
+    windows = meeting_windows(relevant_sessions)
+    sync_schedule(windows, now)
+
+    # Cap a tick to what the API budget can serve in a few seconds; the rest stays queued
+    rate = meet_client.rate_limiter.rate
+    limit = max(1, int(rate * MAX_TICK_SECONDS / CALLS_PER_POLL)) if rate > 0 else None
+    due = poll_scheduler.pop_due(now, limit)
+    if limit is not None and len(due) == limit:
+        report_deferred(poll_scheduler.count_due(now), rate, now)
+    return skeleton, current_active, by_hour, relevant_sessions, windows, due
+
+def report_deferred(carried, rate, now):
+    """Counts due meetings the budget pushed to a later tick; warns at most once a minute."""
+    global last_deferred_warning
+    if not carried:
+        return
+    metrics.polls_deferred_total.inc(carried)
+    if now - last_deferred_warning >= 60:
+        last_deferred_warning = now
+        print(f"⚠️ [ATTENDANCE] MEET_RPS={rate:g} leaves {carried} due meetings queued for later ticks; raise it to poll them on time.")
+
+def finish_tick(view, tick, states, cycle_start):
+    """Stores the polled states, reschedules their meetings and publishes a snapshot if anything changed."""
+    global enriched_sessions
+    skeleton, current_active, by_hour, relevant_sessions, windows, due = tick
+    now = time.time()
+    dirty = view != (skeleton, current_active)
+    for code in due:
+        state = states.get(code)
+        if state is None:
+            poll_scheduler.schedule(code, now + scheduler.FAST_INTERVAL)
+            continue
+        if not state.get('participants'):
+            # Empty call: the next poll re-resolves in case a new conference started
+            conference_cache.invalidate(code)
+        previous = meeting_states.get(code)
+        changed = previous is not None and state != previous
+        dirty = dirty or state != previous
+        meeting_states[code] = state
+        # Also when unchanged: a session entering its window is observed from this poll on
+        if reconciler.update_meeting(code, state.get('participants', []), now):
+            dirty = True
+        start, end = windows[code]
+        delay = scheduler.next_poll_delay(start, end, state, changed, now)
+        if delay is not None:
+            poll_scheduler.schedule(code, now + delay)
+
+    if dirty:
+        enriched = []
+        for s in relevant_sessions:
+            s = s.copy()
+            if s["meetingLink"]:
+                s.update(meeting_states.get(meeting_code(s["meetingLink"]), {}))
+                s.update(reconciler.fields(s["id"]))
+            enriched.append(s)
+        other_sessions = heapq.merge(*(group for h, group in by_hour.items() if h not in current_active), key=start_key)
+        final_list = list(heapq.merge(enriched, other_sessions, key=start_key))
+        with lock: enriched_sessions = final_list
+        snapshots.publish(final_list)
+        view = (skeleton, current_active)
+    if due or dirty:
+        metrics.cycle_seconds.observe(time.perf_counter() - cycle_start, loop="attendance")
+    next_due = poll_scheduler.next_due()
+    return view, None if next_due is None else next_due - time.time()
 
 def attendance_monitor():
-    global enriched_sessions, calendar_skeleton, active_timeframes, creds
+    view = None
     while True:
         try:
-            if not creds or not calendar_skeleton:
+            if not creds or not calendar_skeleton or not roster_ready.is_set():
                 time.sleep(2)
                 continue
-            with lock: current_active = list(active_timeframes)
-            if not current_active:
-                time.sleep(5)
+            view, wait = attendance_tick(view)
+        except Exception as e:
+            print(f"❌ [ATTENDANCE] Error: {e}")
+            wait = None
+        wait_for_work(MAX_IDLE_WAIT if wait is None else min(max(wait, 0.5), MAX_IDLE_WAIT))
+
+def wait_for_work(timeout):
+    """Sleeps until the next poll is due or the timeframes change; a burst of changes is coalesced."""
+    if config_changed.wait(timeout):
+        time.sleep(CONFIG_COALESCE)
+        config_changed.clear()
+
+def set_timeframes(timeframes):
+    """
+    Swaps the selected timeframes and wakes the monitor. Queued polls for
+    meetings that are only in the hours just removed are cancelled; the next
+    tick drops them from the schedule and polls the newly added hours first.
+    """
+    global active_timeframes
+    with lock:
+        previous = set(active_timeframes)
+        active_timeframes = timeframes
+        by_hour = skeleton_by_hour
+    selected = set(timeframes)
+    if selected == previous:
+        return
+    removed = previous - selected
+    if removed:
+        keep = {meeting_code(s["meetingLink"]) for h in selected for s in by_hour.get(h, []) if s["meetingLink"]}
+        for h in removed:
+            for s in by_hour.get(h, []):
+                code = meeting_code(s["meetingLink"]) if s["meetingLink"] else None
+                if code and code not in keep:
+                    meet_client.cancel(('meeting', code))
+                    meet_client.cancel(('resolve', code))
+    config_changed.set()
+
+# --- asyncio engine (MONITOR_ENGINE=asyncio) -----------------------------
+# Same loops as above, but every API call is a coroutine on one event loop
+# sharing a pooled HTTP/2 client (see async_engine), so a cycle can have
+# hundreds of requests in flight without a thread per request. Snapshot
+# building, roster matching and SQLite writes run in worker threads
+# (asyncio.to_thread) so they never stall the requests in flight.
+
+async def fetch_meeting_async(client, conf_code):
+    conf_id = conference_cache.get(conf_code)
+    if not conf_id:
+        records = await client.find_conference_records(conf_code, running_only=ACTIVE_PARTICIPANTS_ONLY)
+        conf_id = await asyncio.to_thread(remember_conference, conf_code, records)
+    if not conf_id:
+        return {"status": "IDLE", "participants": []}
+    p_data, recs = await asyncio.gather(client.get_participants(conf_id, ACTIVE_PARTICIPANTS_ONLY), client.get_recordings(conf_id))
+    return await asyncio.to_thread(meeting_state, conf_code, conf_id, p_data, recs)
+
+async def fetch_states_async(client, conf_codes):
+    results = await asyncio.gather(*(fetch_meeting_async(client, code) for code in conf_codes), return_exceptions=True)
+    states = {}
+    for code, result in zip(conf_codes, results):
+        if isinstance(result, Exception):
+            print(f"Error enriching {code}: {result}")
+        else:
+            states[code] = result
+    return states
+
+async def sync_skeleton_async(client, sync):
+    cycle_start = time.perf_counter()
+    t_min, t_max = skeleton_range()
+    if CALENDAR_SYNC_MODE == 'incremental':
+        events = await sync.sync(client, t_min, t_max)
+    else:
+        events = await client.get_upcoming_events(max_results=5000, time_min=t_min, time_max=t_max)
+    await asyncio.to_thread(publish_skeleton, events, cycle_start)
+
+async def attendance_tick_async(client, view=None):
+    cycle_start = time.perf_counter()
+    tick = await asyncio.to_thread(plan_tick)
+    due = tick[-1]
+    states = await fetch_states_async(client, due) if due else {}
+    return await asyncio.to_thread(finish_tick, view, tick, states, cycle_start)
+
+async def skeleton_loader_async(client, sync):
+    while True:
+        try:
+            await sync_skeleton_async(client, sync)
+            await asyncio.to_thread(reload_roster_if_changed)
+        except Exception as e:
+            print(f"❌ [SKELETON] Error: {e}")
+        await asyncio.sleep(SKELETON_INTERVAL)
+
+async def attendance_monitor_async(client):
+    view = None
+    while True:
+        try:
+            if not calendar_skeleton or not roster_ready.is_set():
+                await asyncio.sleep(2)
                 continue
-            relevant_sessions = []
-            other_sessions = []
-            for s in calendar_skeleton:
-                if get_hour_label(s["startTime"]) in current_active:
-                    relevant_sessions.append(s.copy())
-                else:
-                    other_sessions.append(s)
-            
-            def process_session(session):
-                if not session["meetingLink"]: return session
-                try:
-                    conf_code = session["meetingLink"].split('/')[-1].split('?')[0]
-                    filter_q = f'space.meeting_code="{conf_code}"'
-                    records = meet_client.list_conference_records(creds, filter_query=filter_q)
-                    records.sort(key=lambda r: r.get('startTime', ''), reverse=True)
-                    active_record = next((r for r in records if not r.get('endTime')), records[0] if records else None)
-                    if active_record:
-                        conf_id = active_record.get('name')
-                        p_data = meet_client.get_participants(creds, conf_id)
-                        active_p = []
-                        for p in p_data:
-                            if not p.get('latestEndTime'):
-                                display_name = "Guest"
-                                if p.get('signedinUser'): display_name = p['signedinUser'].get('displayName', 'User')
-                                elif p.get('anonymousUser'): display_name = p['anonymousUser'].get('displayName', 'Guest')
-                                match = find_in_db(display_name)
-                                email = match['email'] if match else None
-                                active_p.append({"name": display_name, "email": email, "isActive": True})
-                        session["participants"] = active_p
-                        session["status"] = "ACTIVE" if active_p else "IDLE"
-                        recs = meet_client.get_recordings(creds, conf_id)
-                        session["isRecording"] = any(not r.get('endTime') for r in recs) if recs else False
-                    else:
-                        session["status"] = "IDLE"
-                        session["participants"] = []
-                except Exception as e:
-                    print(f"Error enriching {session.get('summary')}: {e}")
-                return session
-
-            with ThreadPoolExecutor(max_workers=30) as executor:
-                processed_relevant = list(executor.map(process_session, relevant_sessions))
-            final_list = sorted(processed_relevant + other_sessions, key=lambda x: parser.parse(x["startTime"]).timestamp())
-            with lock: enriched_sessions = final_list
+            view, wait = await attendance_tick_async(client, view)
         except Exception as e:
             print(f"❌ [ATTENDANCE] Error: {e}")
-        time.sleep(20)
+            wait = None
+        await asyncio.to_thread(wait_for_work, MAX_IDLE_WAIT if wait is None else min(max(wait, 0.5), MAX_IDLE_WAIT))
+
+async def run_async_loops():
+    try:
+        from . import async_engine
+    except ImportError:
+        import async_engine
+    while not creds:
+        await asyncio.sleep(0.2)
+    client = async_engine.GoogleClient(creds)
+    print(f"⚡ [ASYNC] Engine running with {async_engine.CONCURRENCY} concurrent requests.")
+    try:
+        await asyncio.gather(
+            skeleton_loader_async(client, async_engine.AsyncCalendarSync()),
+            attendance_monitor_async(client)
+        )
+    finally:
+        await client.aclose()
+
+def async_monitor():
+    asyncio.run(run_async_loops())
 
 @app.route('/')
 def serve_index(): return app.send_static_file('index.html')
@@ -212,38 +631,299 @@ def not_found(e): return app.send_static_file('index.html')
 
 @app.route('/debug')
 def debug_info():
+    if not polling:
+        return jsonify({
+            "role": "web",
+            "snapshot_version": snapshots.current.version,
+            "poller": shared_state.get('status') if shared_state else None,
+            "server_time_utc": datetime.datetime.now(datetime.timezone.utc).isoformat()
+        })
     with lock:
         return jsonify({
+            "role": "poller" if shared_state else "all",
             "skeleton_count": len(calendar_skeleton),
             "enriched_count": len(enriched_sessions),
+            "snapshot_version": snapshots.current.version,
+            "conference_cache": conference_cache.stats(),
             "active_timeframes": active_timeframes,
             "has_creds": creds is not None,
+            "roster_size": len(roster),
             "server_time_utc": datetime.datetime.now(datetime.timezone.utc).isoformat()
         })
 
+@app.route('/ready')
+def readiness():
+    """200 once there are sessions to serve (restored, synced or shared by the poller), 503 before."""
+    version = snapshots.current.version
+    if polling:
+        ready = version > 0 or startup_phases.get("first_sync", {}).get("state") == "done"
+    else:
+        ready = version > 0
+    return jsonify({
+        "ready": ready,
+        "role": ("poller" if shared_state else "all") if polling else "web",
+        "uptime": round(time.time() - STARTED_AT, 3),
+        "snapshot_version": version,
+        "phases": dict(startup_phases)
+    }), 200 if ready else 503
+
+def snapshot_response(snap):
+    if snap.etag in request.if_none_match:
+        response = Response(status=304)
+    elif request.accept_encodings['gzip']:
+        response = Response(snap.gzip_body, mimetype='application/json')
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = Response(snap.body, mimetype='application/json')
+    response.set_etag(snap.etag)
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['X-Snapshot-Version'] = str(snap.version)
+    return response
+
+def list_arg(name):
+    return [v for raw in request.args.getlist(name) for v in raw.split(',') if v]
+
 @app.route('/sessions')
 def get_sessions():
-    with lock: return jsonify(enriched_sessions if enriched_sessions else calendar_skeleton)
+    """
+    Full session list, or a filtered page when any of these are given:
+    hour=14:00,15:00  status=ACTIVE  hasParticipants=true|false
+    limit=<n>  cursor=<nextCursor>  fields=id,summary,...  omit=attendees
+    """
+    snap = snapshots.current
+    if not request.args:
+        return snapshot_response(snap)
+    has_p = request.args.get('hasParticipants')
+    positions = snap.select(
+        hours=list_arg('hour'),
+        statuses=list_arg('status'),
+        has_participants=None if has_p is None else has_p.lower() in ('1', 'true', 'yes')
+    )
+    limit = request.args.get('limit', type=int)
+    if 'limit' in request.args and (limit is None or limit < 1):
+        return jsonify({"error": "limit must be a positive integer"}), 400
+    chosen, next_cursor = snap.page(positions, request.args.get('cursor'), limit)
+    sessions = snap.encode(chosen, fields=list_arg('fields'), omit_attendees='attendees' in list_arg('omit'))
+    meta = json.dumps({"version": snap.version, "total": len(positions), "nextCursor": next_cursor})
+    body = meta[:-1].encode('utf-8') + b',"sessions":' + sessions + b'}'
+    response = Response(body, mimetype='application/json')
+    if request.accept_encodings['gzip'] and len(body) > 1024:
+        response.set_data(gzip.compress(body, compresslevel=6))
+        response.headers['Content-Encoding'] = 'gzip'
+    response.set_etag(f"{snap.etag}-{zlib.crc32(request.query_string):08x}")
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response.make_conditional(request)
+
+metrics.Gauge('papaya_name_memo_hits', 'find_in_db memo hits for the current roster.', lambda: name_index.match.cache_info().hits)
+metrics.Gauge('papaya_name_memo_misses', 'find_in_db memo misses for the current roster.', lambda: name_index.match.cache_info().misses)
+metrics.Gauge('papaya_conference_cache_hits', 'Conference record cache hits.', lambda: conference_cache.hits)
+metrics.Gauge('papaya_conference_cache_misses', 'Conference record cache misses.', lambda: conference_cache.misses)
+metrics.Gauge('papaya_scheduled_meetings', 'Meetings waiting in the poll scheduler.', lambda: len(poll_scheduler))
+metrics.Gauge('papaya_snapshot_version', 'Version of the published session snapshot.', lambda: snapshots.current.version)
+metrics.Gauge('papaya_skeleton_sessions', 'Sessions in the calendar skeleton.', lambda: len(calendar_skeleton))
+
+@app.route('/metrics')
+def get_metrics():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/sessions/changes')
+def get_session_changes():
+    """
+    Long-poll for session deltas: /sessions/changes?since=<version>[&timeout=<s>].
+    Waits up to `timeout` seconds for a newer snapshot, then returns only the
+    sessions that changed (keyed by id) plus per-session join/leave/status details.
+    Clients that fell out of the delta buffer, or hold a version from before a
+    restart, get {"reset": true} with the full list.
+    """
+    since = request.args.get('since', type=int)
+    timeout = request.args.get('timeout', 25, type=float)
+    # nan would make the wait unbounded, so anything that is not a finite number waits the default
+    timeout = max(0.0, min(timeout, 55)) if math.isfinite(timeout) else 25
+    if since is None or since > snapshots.current.version:
+        return full_reset_response(snapshots.current)
+    if snapshots.current.version <= since:
+        snapshots.wait_for_change(since, timeout)
+    changes = snapshots.changes_since(since)
+    if changes is None:
+        return full_reset_response(snapshots.current)
+    return jsonify(changes)
+
+def full_reset_response(snap):
+    body = b'{"version":%d,"reset":true,"sessions":' % snap.version + snap.body + b'}'
+    return Response(body, mimetype='application/json')
+
+def range_args(default_days=7):
+    """
+    start/end query args (ISO dates or datetimes) as epoch seconds, defaulting
+    to the last week. Returns None when one of them does not parse.
+    """
+    try:
+        end = request.args.get('end')
+        end_ts = parse_ts(end) if end else time.time()
+        start = request.args.get('start')
+        start_ts = parse_ts(start) if start else end_ts - default_days * 86400
+    except (ValueError, OverflowError):
+        return None
+    return start_ts, end_ts
+
+@app.route('/attendance/students/<email>')
+def student_attendance(email):
+    if not attendance_store: return jsonify({"error": "attendance history disabled"}), 404
+    window = range_args()
+    if window is None: return jsonify({"error": "start/end must be ISO dates"}), 400
+    return jsonify(attendance_store.student_minutes(email.lower(), *window))
+
+@app.route('/attendance/sessions')
+def session_attendance():
+    if not attendance_store: return jsonify({"error": "attendance history disabled"}), 404
+    window = range_args()
+    if window is None: return jsonify({"error": "start/end must be ISO dates"}), 400
+    return jsonify(attendance_store.session_rates(*window))
+
+@app.route('/attendance/summary')
+def attendance_summary():
+    """
+    Expected vs present attendance per hour bucket: /attendance/summary[?hour=14:00,15:00].
+    Counts only cover sessions whose meeting is being polled ("observed").
+    """
+    hours = list_arg('hour') or None
+    if polling:
+        return jsonify(reconciler.summary(hours))
+    shared = shared_state.get('reconciliation') if shared_state else None
+    return jsonify(reconcile.summarize(shared or {}, hours))
 
 @app.route('/sync-config', methods=['POST'])
 def update_sync_config():
-    global active_timeframes
     data = request.json
-    with lock: active_timeframes = data.get('timeframes', [])
+    timeframes = data.get('timeframes', [])
+    if shared_state:
+        # Web workers hand the selection to the poller through the shared store
+        shared_state.set('timeframes', timeframes)
+    if polling:
+        set_timeframes(timeframes)
     return jsonify({"success": True})
 
-def background_startup():
+def finish_phase(name, start, error=None):
+    entry = {
+        "state": "failed" if error else "done",
+        "seconds": round(time.perf_counter() - start, 3),
+        "at": round(time.time() - STARTED_AT, 3)
+    }
+    if error:
+        entry["error"] = str(error)
+    startup_phases[name] = entry
+
+def run_phase(name, step):
+    """Runs one startup step, recording its state and timing for /ready."""
+    startup_phases[name] = {"state": "running"}
+    start = time.perf_counter()
+    try:
+        step()
+    except Exception as e:
+        print(f"❌ [STARTUP] {name} failed: {e}")
+        finish_phase(name, start, e)
+        return
+    finish_phase(name, start)
+
+def load_credentials():
     global creds
-    load_databases()
+    creds = auth.get_manager()
+    print("✅ [STARTUP] Auth success.")
+
+def background_startup():
+    """Restores the last skeleton, then loads the roster and authenticates in parallel."""
+    run_phase("restore", restore_skeleton)
+    threading.Thread(target=run_phase, args=("roster", load_roster), daemon=True).start()
+    run_phase("auth", load_credentials)
+
+def poller_status():
+    with lock:
+        return {
+            "skeleton_count": len(calendar_skeleton),
+            "enriched_count": len(enriched_sessions),
+            "active_timeframes": active_timeframes,
+            "has_creds": creds is not None,
+            "roster_size": len(roster),
+            "conference_cache": conference_cache.stats(),
+            "pid": os.getpid()
+        }
+
+def share_snapshot(snapshot, delta):
     try:
-        creds = auth.authenticate()
-        print("✅ [STARTUP] Auth success.")
+        shared_state.write_snapshot(snapshot, delta)
     except Exception as e:
-        print(f"❌ [STARTUP] Auth failed: {e}")
+        print(f"❌ [SHARED] Could not write snapshot {snapshot.version}: {e}")
+
+def poller_sync():
+    """Poller side of the shared store: picks up timeframes set by web workers and publishes its status."""
+    seen = None
+    last_status = None
+    last_summary = None
+    while True:
+        try:
+            timeframes = shared_state.get('timeframes')
+            if timeframes is not None and timeframes != seen:
+                seen = timeframes
+                set_timeframes(timeframes)
+            summary = reconciler.summary()["hours"]
+            if summary != last_summary:
+                shared_state.set('reconciliation', summary)
+                last_summary = summary
+            status = poller_status()
+            if status != last_status:
+                shared_state.set('status', status)
+                last_status = status
+        except Exception as e:
+            print(f"❌ [SHARED] Poller sync error: {e}")
+        time.sleep(SHARED_SYNC_INTERVAL)
+
+def web_sync():
+    """Web worker side: adopts every snapshot the poller publishes; takes over polling if the poller exits (auto/poller roles)."""
+    while True:
+        try:
+            if shared_state.version() > snapshots.current.version:
+                version, sessions, deltas = shared_state.read_since(snapshots.current.version)
+                snapshots.install(version, sessions, deltas)
+            if ROLE in ('auto', 'poller') and shared_state.try_become_poller():
+                print(f"♻️ [SHARED] Poller lock was free, worker {os.getpid()} takes over polling.")
+                start_polling()
+                return
+        except Exception as e:
+            print(f"❌ [SHARED] Web sync error: {e}")
+        time.sleep(SHARED_SYNC_INTERVAL)
+
+def start_polling():
+    global polling, active_timeframes
+    polling = True
+    if attendance_store:
+        # Only the poller records history (web workers just read it)
+        attendance_store.start_writing()
+    if shared_state:
+        # Continue the shared version sequence and restore the last selection
+        restored = shared_state.read_since(snapshots.current.version)
+        if restored:
+            snapshots.install(*restored)
+        active_timeframes = shared_state.get('timeframes', active_timeframes)
+        snapshots.on_publish = share_snapshot
+        threading.Thread(target=poller_sync, daemon=True).start()
+    threading.Thread(target=background_startup, daemon=True).start()
+    if ENGINE == 'asyncio':
+        threading.Thread(target=async_monitor, daemon=True).start()
+        return
+    threading.Thread(target=skeleton_loader, daemon=True).start()
+    threading.Thread(target=attendance_monitor, daemon=True).start()
+
+def start_background():
+    if ROLE in ('auto', 'poller') and not shared_state.try_become_poller():
+        print(f"⚠️ [SHARED] Another process holds the poller lock, worker {os.getpid()} only serves requests.")
+    elif ROLE != 'web':
+        start_polling()
+        return
+    threading.Thread(target=web_sync, daemon=True).start()
 
-threading.Thread(target=background_startup, daemon=True).start()
-threading.Thread(target=skeleton_loader, daemon=True).start()
-threading.Thread(target=attendance_monitor, daemon=True).start()
+# Tools that drive the loops themselves (bench/) import the module with MONITOR_AUTOSTART=0
+if os.environ.get('MONITOR_AUTOSTART', '1') == '1':
+    start_background()
 
 if __name__ == '__main__':
     app.run(port=3001, host='0.0.0.0')
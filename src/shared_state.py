@@ -0,0 +1,92 @@
+import fcntl
+import json
+import sqlite3
+import threading
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshot (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    version INTEGER NOT NULL,
+    body BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS deltas (
+    version INTEGER PRIMARY KEY,
+    delta TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS settings (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+class SharedState:
+    """
+    Local SQLite file (WAL mode) that lets one poller process and any number of
+    web workers share the published sessions. The poller writes every snapshot
+    with its delta; web workers check the version, load what is new, and write
+    settings such as the selected timeframes back for the poller.
+    """
+
+    def __init__(self, path, history=120):
+        self.path = path
+        self.history = history
+        self.lock = threading.Lock()
+        self._lock_file = None
+        self.db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+
+    def try_become_poller(self):
+        """Takes the poller lock without blocking; it is held until this process exits."""
+        if self._lock_file:
+            return True
+        f = open(self.path + '.lock', 'w')
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return False
+        self._lock_file = f
+        return True
+
+    def write_snapshot(self, snapshot, delta):
+        """Stores the latest snapshot body and its delta (version, changed, removed, details)."""
+        version, changed, removed, details = delta
+        with self.lock, self.db:
+            self.db.execute("INSERT OR REPLACE INTO snapshot VALUES (1, ?, ?)", (snapshot.version, snapshot.body))
+            self.db.execute(
+                "INSERT OR REPLACE INTO deltas VALUES (?, ?)",
+                (version, json.dumps({"changed": changed, "removed": removed, "details": details}))
+            )
+            self.db.execute("DELETE FROM deltas WHERE version <= ?", (version - self.history,))
+
+    def version(self):
+        with self.lock:
+            row = self.db.execute("SELECT version FROM snapshot WHERE id = 1").fetchone()
+        return row[0] if row else 0
+
+    def read_since(self, since):
+        """Returns (version, sessions, deltas newer than `since`) or None if nothing was published."""
+        with self.lock, self.db:
+            row = self.db.execute("SELECT version, body FROM snapshot WHERE id = 1").fetchone()
+            if not row:
+                return None
+            rows = self.db.execute(
+                "SELECT version, delta FROM deltas WHERE version > ? AND version <= ? ORDER BY version",
+                (since, row[0])
+            ).fetchall()
+        deltas = []
+        for version, raw in rows:
+            d = json.loads(raw)
+            deltas.append((version, d["changed"], d["removed"], d["details"]))
+        return row[0], json.loads(row[1]), deltas
+
+    def get(self, key, default=None):
+        with self.lock:
+            row = self.db.execute("SELECT value FROM settings WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set(self, key, value):
+        with self.lock, self.db:
+            self.db.execute("INSERT OR REPLACE INTO settings VALUES (?, ?)", (key, json.dumps(value)))
@@ -0,0 +1,212 @@
+from collections import deque
+import bisect
+import gzip
+import hashlib
+import json
+import threading
+
+def _encode(value):
+    return json.dumps(value, separators=(',', ':')).encode('utf-8')
+
+class Snapshot:
+    """
+    Immutable view of the session list served by /sessions.
+    The JSON body (plain and gzip), its ETag, one encoded fragment per session
+    (with and without attendees) and the filter indexes are computed once, when
+    the snapshot is published, so serving it is just handing out bytes.
+    Session dicts must not be mutated after they are published.
+    """
+
+    def __init__(self, version, sessions):
+        self.version = version
+        self.sessions = tuple(sessions)
+        self.fragments = [_encode(s) for s in self.sessions]
+        self.compact_fragments = [
+            _encode({k: v for k, v in s.items() if k != 'attendees'}) for s in self.sessions
+        ]
+        self.body = b'[' + b','.join(self.fragments) + b']'
+        self.gzip_body = gzip.compress(self.body, compresslevel=6)
+        # Content based, so it survives restarts and is identical across processes
+        self.etag = hashlib.blake2b(self.body, digest_size=12).hexdigest()
+
+        # Filter indexes: value -> ascending positions in self.sessions
+        self.by_hour = {}
+        self.by_status = {}
+        self.with_participants = []
+        self.positions = {}
+        for pos, s in enumerate(self.sessions):
+            self.by_hour.setdefault(s.get('hour'), []).append(pos)
+            self.by_status.setdefault(s.get('status'), []).append(pos)
+            if s.get('participants'):
+                self.with_participants.append(pos)
+            self.positions[s.get('id')] = pos
+        self._participant_set = set(self.with_participants)
+
+    def select(self, hours=None, statuses=None, has_participants=None):
+        """Returns ascending positions of the sessions matching every given filter."""
+        candidates = []
+        if hours:
+            candidates.append(sorted(p for h in set(hours) for p in self.by_hour.get(h, [])))
+        if statuses:
+            candidates.append(sorted(p for st in set(statuses) for p in self.by_status.get(st, [])))
+        if has_participants is True:
+            candidates.append(self.with_participants)
+        if not candidates:
+            positions = range(len(self.sessions))
+        else:
+            candidates.sort(key=len)
+            positions = candidates[0]
+            for other in candidates[1:]:
+                other = self._participant_set if other is self.with_participants else set(other)
+                positions = [p for p in positions if p in other]
+        if has_participants is False:
+            positions = [p for p in positions if p not in self._participant_set]
+        return positions
+
+    def page(self, positions, cursor=None, limit=None):
+        """
+        Slices `positions` after an opaque cursor ('<position>.<session id>').
+        The id is preferred so the cursor survives newer snapshots; the position is the fallback.
+        Returns (page positions, next cursor or None).
+        """
+        start = 0
+        if cursor:
+            pos, _, sid = cursor.partition('.')
+            anchor = self.positions.get(sid, int(pos) if pos.isdigit() else 0)
+            start = bisect.bisect_left(positions, anchor)
+        end = len(positions) if not limit else min(len(positions), start + limit)
+        chosen = positions[start:end]
+        next_cursor = None
+        if end < len(positions):
+            nxt = positions[end]
+            next_cursor = f"{nxt}.{self.sessions[nxt].get('id')}"
+        return chosen, next_cursor
+
+    def encode(self, positions, fields=None, omit_attendees=False):
+        """JSON array bytes for the given positions, projected to `fields` when set."""
+        if fields:
+            return _encode([{k: self.sessions[p][k] for k in fields if k in self.sessions[p]} for p in positions])
+        fragments = self.compact_fragments if omit_attendees else self.fragments
+        return b'[' + b','.join(fragments[p] for p in positions) + b']'
+
+def _participant_keys(session):
+    return {(p.get('name'), p.get('email')) for p in session.get('participants', [])}
+
+def diff_sessions(old, new):
+    """Compares two session lists keyed by id. Returns (changed sessions, removed ids, details)."""
+    previous = {s['id']: s for s in old}
+    changed = []
+    details = {}
+    for session in new:
+        sid = session['id']
+        before = previous.pop(sid, None)
+        if before is session or before == session:
+            continue
+        changed.append(session)
+        if before is None:
+            details[sid] = {"added": True}
+            continue
+        info = {}
+        joined = _participant_keys(session) - _participant_keys(before)
+        left = _participant_keys(before) - _participant_keys(session)
+        if joined: info["joined"] = [{"name": n, "email": e} for n, e in sorted(joined, key=str)]
+        if left: info["left"] = [{"name": n, "email": e} for n, e in sorted(left, key=str)]
+        if before.get('status') != session.get('status'):
+            info["status"] = [before.get('status'), session.get('status')]
+        if before.get('isRecording') != session.get('isRecording'):
+            info["isRecording"] = session.get('isRecording')
+        details[sid] = info
+    return changed, list(previous), details
+
+class SnapshotStore:
+    """
+    Holds the latest Snapshot. Readers take `current` without locking.
+    Every publish also records the delta from the previous snapshot in a
+    bounded ring buffer so clients can catch up with changes_since().
+    """
+
+    def __init__(self, history=120):
+        self.current = Snapshot(0, [])
+        self.deltas = deque(maxlen=history)
+        # Called as on_publish(snapshot, delta) under the publish lock, so calls arrive in version order
+        self.on_publish = None
+        self._publish_lock = threading.Lock()
+        self._changed = threading.Condition()
+
+    def publish(self, sessions):
+        with self._publish_lock:
+            previous = self.current
+            snapshot = Snapshot(previous.version + 1, sessions)
+            changed, removed, details = diff_sessions(previous.sessions, snapshot.sessions)
+            delta = (snapshot.version, changed, removed, details)
+            self.deltas.append(delta)
+            self.current = snapshot
+            if self.on_publish:
+                self.on_publish(snapshot, delta)
+        with self._changed:
+            self._changed.notify_all()
+        return snapshot
+
+    def install(self, version, sessions, deltas):
+        """
+        Adopts a snapshot published by another process (see shared_state) with
+        its version and the deltas that lead to it. If the deltas do not start
+        right after the local version, the local history cannot bridge the gap
+        and is discarded, so older clients get a reset.
+        """
+        with self._publish_lock:
+            if version <= self.current.version:
+                return self.current
+            if not deltas or deltas[0][0] != self.current.version + 1:
+                self.deltas.clear()
+            self.deltas.extend(deltas)
+            self.current = Snapshot(version, sessions)
+        with self._changed:
+            self._changed.notify_all()
+        return self.current
+
+    def wait_for_change(self, since, timeout):
+        """Blocks until a snapshot newer than `since` exists or the timeout expires."""
+        with self._changed:
+            self._changed.wait_for(lambda: self.current.version > since, timeout=timeout)
+        return self.current
+
+    def changes_since(self, since):
+        """
+        Merges the recorded deltas after version `since` up to the current snapshot.
+        Returns None when `since` is older than the ring buffer or newer than the
+        current version (the server restarted); either way the client must reload.
+        """
+        current = self.current
+        if since > current.version:
+            return None
+        if since == current.version:
+            return {"version": current.version, "changed": [], "removed": [], "details": {}}
+        deltas = [d for d in list(self.deltas) if since < d[0] <= current.version]
+        if not deltas or deltas[0][0] != since + 1:
+            return None
+        changed = {}
+        removed = set()
+        details = {}
+        for _, sessions, removed_ids, info in deltas:
+            for session in sessions:
+                changed[session['id']] = session
+                removed.discard(session['id'])
+            for sid in removed_ids:
+                changed.pop(sid, None)
+                details.pop(sid, None)
+                removed.add(sid)
+            for sid, entry in info.items():
+                _merge_details(details.setdefault(sid, {}), entry)
+        return {"version": current.version, "changed": list(changed.values()), "removed": sorted(removed), "details": details}
+
+def _merge_details(merged, entry):
+    for key, value in entry.items():
+        if key in ("joined", "left"):
+            merged.setdefault(key, []).extend(value)
+        elif key == "status" and "status" in merged:
+            merged["status"] = [merged["status"][0], value[1]]
+            if merged["status"][0] == merged["status"][1]:
+                del merged["status"]
+        else:
+            merged[key] = value
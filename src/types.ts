@@ -19,5 +19,13 @@ export interface Session {
   isRecording: boolean;
   startTime: string;
   endTime: string;
+  startTs?: number; // epoch seconds, precomputed by the server
+  endTs?: number;
+  hour?: string; // Central-time bucket, e.g. "14:00"
   status: 'IDLE' | 'ACTIVE' | 'UPCOMING';
+  // Expected vs actual attendance, set once the meeting has been polled
+  expectedCount?: number;
+  present?: string[]; // expected attendee emails currently in the call
+  absent?: string[]; // expected attendee emails not in the call
+  unexpected?: string[]; // participants not on the invite (email, or name if unmatched)
 }